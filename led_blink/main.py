@@ -1,4 +1,4 @@
-from machine import Pin, Timer
+from machine import Pin, Timer, idle
 
 led = Pin(25, Pin.OUT)
 timer = Timer()
@@ -11,4 +11,4 @@ def blink(timer: Timer):
 timer.init(freq=2, mode=Timer.PERIODIC, callback=blink)
 
 while True:
-    pass
+    idle()
@@ -1,45 +1,13 @@
-from machine import Pin, Timer, PWM
-
-
-class State:
-    UP = int(1)
-    DOWN = int(2)
-
+from machine import idle
+from leds import LedEngine, LEVEL_MAX
 
 p_led_pin = 25
-k_pwm_max = 65025
-
-
-def pwm_duty(ratio: float) -> int:
-    """Calculate PWM duty cycle from a ratio (0.0 to 1.0)"""
-    return int(k_pwm_max * max(min(ratio, 1.0), 0.0))
-
-
-class LedFader:
-    def __init__(self) -> None:
-        self.brightness = 0.0
-        self.timer = Timer()
-        self.led = PWM(Pin(p_led_pin, Pin.OUT))
-        self.state = State.UP
-
-        self.led.freq(1000)
-        self.timer.init(period=5, mode=Timer.PERIODIC, callback=self.update)
-
-    def update(self, timer):
-        if self.brightness >= 1:
-            self.state = State.DOWN
-        elif self.brightness <= 0:
-            self.state = State.UP
-
-        if self.state is State.UP:
-            self.brightness += 0.01
-        elif self.state is State.DOWN:
-            self.brightness -= 0.01
-
-        self.led.duty_u16(pwm_duty(self.brightness))
+k_fade_period_ms = 1000
 
 
-led_fader = LedFader()
+leds = LedEngine([p_led_pin], tick_ms=5)
+leds.pulse(0, 0, LEVEL_MAX, k_fade_period_ms)
+leds.start()
 
 while True:
-    pass
+    idle()
@@ -0,0 +1,229 @@
+from micropython import const
+from machine import Pin, Timer
+
+try:
+    from machine import mem32
+except ImportError:
+    mem32 = None
+
+# RP2040 SIO GPIO registers
+_SIO_GPIO_IN = const(0xD0000004)
+_SIO_GPIO_OUT_CLR = const(0xD0000018)
+_SIO_GPIO_OE_SET = const(0xD0000024)
+_SIO_GPIO_OE_CLR = const(0xD0000028)
+
+# Button events
+PRESS = const(1)
+RELEASE = const(2)
+HOLD = const(3)
+REPEAT = const(4)
+
+
+class ButtonScanner:
+    """Debounces a set of active-low buttons from one periodic tick.
+
+    Every scan() samples all buttons with a single read of the GPIO input
+    register and feeds a per-button integrator: a button only changes state
+    after `samples` consecutive agreeing reads, so the worst case
+    input-to-event latency is samples * period_ms. handler(index, event)
+    receives PRESS, RELEASE and HOLD (pressed for hold_ms) events, index
+    being the position of the pin in `pins`.
+
+    Buttons set up with repeat() also send REPEAT events while held, faster
+    and faster.
+    """
+
+    keys = 0  # buttons ahead of the pins, see KeyMatrix
+
+    def __init__(
+        self, pins, handler, samples: int = 5, period_ms: int = 2, hold_ms: int = 500
+    ) -> None:
+        self.pins = [Pin(p, Pin.IN, Pin.PULL_UP) for p in pins]
+        self.masks = [1 << p for p in pins]
+        self.handler = handler
+        self.samples = samples
+        self.period_ms = period_ms
+        self.latency_ms = samples * period_ms
+        self.hold_ticks = hold_ms // period_ms
+
+        n = self.keys + len(pins)
+        self.count = bytearray(n)  # integrators
+        self.held = [0] * n  # ticks since the press
+        self.pressed = 0  # debounced state, one bit per button
+
+        # Auto-repeat, in ticks, delay 0 for buttons without
+        self.rep_delay = [0] * n
+        self.rep_interval = [0] * n
+        self.rep_min = [0] * n
+        self.rep_accel = [100] * n
+        self.rep_next = [0] * n  # held count of the next REPEAT
+        self.rep_step = [0] * n  # current interval
+
+        self._timer = None
+
+    def start(self) -> None:
+        """Scan from a dedicated timer, for programs without a scheduler"""
+        self._timer = Timer()
+        self._timer.init(mode=Timer.PERIODIC, period=self.period_ms, callback=self._tick)
+
+    def stop(self) -> None:
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
+
+    def repeat(
+        self, idx: int, delay_ms: int = 400, interval_ms: int = 150, min_ms: int = 10, accel: int = 75
+    ) -> None:
+        """Send REPEAT every interval_ms once the button has been held for
+        delay_ms. Each repeat the interval shrinks to accel percent of the
+        previous one, down to min_ms."""
+        period = self.period_ms
+        self.rep_delay[idx] = max(delay_ms // period, 1)
+        self.rep_interval[idx] = max(interval_ms // period, 1)
+        self.rep_min[idx] = max(min_ms // period, 1)
+        self.rep_accel[idx] = accel
+
+    def is_pressed(self, idx: int) -> bool:
+        return bool(self.pressed & (1 << idx))
+
+    def read(self) -> int:
+        """Raw GPIO input levels, one bit per GPIO number"""
+        if mem32 is not None:
+            return mem32[_SIO_GPIO_IN]
+        port = 0
+        for i in range(len(self.pins)):
+            if self.pins[i].value():
+                port |= self.masks[i]
+        return port
+
+    def sample(self) -> int:
+        """Raw state, one bit per button, set while it is down"""
+        port = self.read()
+        masks = self.masks
+        down = 0
+        for i in range(len(masks)):
+            if not port & masks[i]:
+                down |= 1 << i
+        return down << self.keys
+
+    def scan(self) -> None:
+        down = self.sample()
+        count = self.count
+        for i in range(len(count)):
+            bit = 1 << i
+            if down & bit:
+                # Low level, pressed
+                if count[i] < self.samples:
+                    count[i] += 1
+                    if count[i] == self.samples and not self.pressed & bit:
+                        self.pressed |= bit
+                        self.held[i] = 0
+                        self.rep_next[i] = self.rep_delay[i]
+                        self.rep_step[i] = self.rep_interval[i]
+                        self.handler(i, PRESS)
+                elif self.pressed & bit:
+                    held = self.held[i] + 1
+                    self.held[i] = held
+                    if held == self.hold_ticks:
+                        self.handler(i, HOLD)
+                    if held == self.rep_next[i] and self.rep_delay[i]:
+                        step = self.rep_step[i]
+                        self.rep_next[i] = held + step
+                        self.rep_step[i] = max(step * self.rep_accel[i] // 100, self.rep_min[i])
+                        self.handler(i, REPEAT)
+            elif count[i]:
+                count[i] -= 1
+                if count[i] == 0 and self.pressed & bit:
+                    self.pressed &= ~bit
+                    self.handler(i, RELEASE)
+
+    def _tick(self, t: Timer) -> None:
+        self.scan()
+
+
+class KeyMatrix(ButtonScanner):
+    """ButtonScanner for a row/column key matrix, plus direct pins.
+
+    Rows are open drain, latched low and pulled up while released, columns
+    are inputs with pull-ups. Every scan() drives the rows low one at a
+    time through the GPIO output enable register and reads all the columns
+    with one read of the input register, so the whole matrix is sampled
+    each tick and the latency stays samples * period_ms. Key r, c is
+    button r * len(cols) + c, the pins follow the keys.
+
+    Without a diode per key, three keys down on the corners of a rectangle
+    also pull down the fourth corner. When two rows read the same two
+    columns or more, those keys keep their debounced state until the
+    reading is unambiguous again. Pass diodes=True to skip that.
+    """
+
+    def __init__(
+        self,
+        rows,
+        cols,
+        pins,
+        handler,
+        samples: int = 5,
+        period_ms: int = 2,
+        hold_ms: int = 500,
+        diodes: bool = False,
+    ) -> None:
+        self.keys = len(rows) * len(cols)
+        super().__init__(pins, handler, samples, period_ms, hold_ms)
+        self.rows = [Pin(p, Pin.IN, Pin.PULL_UP) for p in rows]
+        self.cols = [Pin(p, Pin.IN, Pin.PULL_UP) for p in cols]
+        self.row_masks = [1 << p for p in rows]
+        self.col_masks = [1 << p for p in cols]
+        if mem32 is not None:
+            # Latch the rows low, the output enable does the driving
+            for mask in self.row_masks:
+                mem32[_SIO_GPIO_OUT_CLR] = mask
+        self.diodes = diodes
+        self.row_bits = [0] * len(rows)  # columns read low per row
+        self.ghosts = 0  # scans with an ambiguous reading
+
+    def _drive(self, r: int, low: bool) -> None:
+        if mem32 is not None:
+            mem32[_SIO_GPIO_OE_SET if low else _SIO_GPIO_OE_CLR] = self.row_masks[r]
+        elif low:
+            self.rows[r].init(Pin.OUT, value=0)
+        else:
+            self.rows[r].init(Pin.IN, Pin.PULL_UP)
+
+    def sample(self) -> int:
+        row_bits = self.row_bits
+        col_masks = self.col_masks
+        n = len(col_masks)
+        for r in range(len(row_bits)):
+            self._drive(r, True)
+            if mem32 is not None:
+                port = mem32[_SIO_GPIO_IN]
+            else:
+                port = 0
+                for c in range(n):
+                    if self.cols[c].value():
+                        port |= col_masks[c]
+            self._drive(r, False)
+            bits = 0
+            for c in range(n):
+                if not port & col_masks[c]:
+                    bits |= 1 << c
+            row_bits[r] = bits
+
+        down = super().sample()
+        ghost = False
+        for r in range(len(row_bits)):
+            bits = row_bits[r]
+            unsure = 0
+            if not self.diodes and bits & (bits - 1):
+                for other in range(len(row_bits)):
+                    shared = bits & row_bits[other]
+                    if other != r and shared & (shared - 1):
+                        unsure |= shared
+            if unsure:
+                ghost = True
+                bits = (bits & ~unsure) | ((self.pressed >> (r * n)) & unsure)
+            down |= bits << (r * n)
+        if ghost:
+            self.ghosts += 1
+        return down
@@ -0,0 +1,115 @@
+from micropython import const
+from time import ticks_us, ticks_diff
+from array import array
+
+# Stages, timed from the button edge
+EDGE = const(0)  # falling edge of a button
+PRESS = const(1)  # debounced press event
+QUEUED = const(2)  # program change queued
+SENT = const(3)  # program change handed to the UART
+DISPLAY = const(4)  # display updated
+SAVED = const(5)  # state written to flash
+_STAGES = ("edge", "press", "queued", "sent", "display", "saved")
+_N_STAGES = const(6)
+_BUCKETS = const(24)  # log2 buckets, up to ~8 s
+# Largest small int: bigger values read from the arrays would allocate
+_MAX = const(0x3FFFFFFF)
+
+
+class Tracer:
+    """Latency tracing from a button edge through the later stages.
+
+    begin() opens a trace on a button edge, mark(stage) records the time of
+    a stage once per trace. Every mark goes into a fixed-size ring buffer of
+    (stage, ticks_us) and into per-stage statistics (min, max, average and
+    a log2 histogram for percentiles) of the delay since the edge. Nothing
+    is allocated after construction, begin() is safe to call from a hard
+    IRQ handler: every value kept stays a small int, the totals stop
+    growing before they would leave that range and the averages then cover
+    the samples summed so far.
+    """
+
+    def __init__(self, size: int = 64) -> None:
+        self.size = size
+        self.ticks = array("i", [0] * size)
+        self.stages = bytearray(size)
+        self.head = 0
+
+        self.start = 0
+        self.seen = 0  # stages marked in the current trace, one bit each
+        self.open = False
+
+        self.count = array("i", [0] * _N_STAGES)
+        self.total = array("i", [0] * _N_STAGES)
+        self.summed = array("i", [0] * _N_STAGES)  # samples in total
+        self.min = array("i", [_MAX] * _N_STAGES)
+        self.max = array("i", [0] * _N_STAGES)
+        self.hist = array("i", [0] * (_N_STAGES * _BUCKETS))
+
+    def begin(self, p=None) -> None:
+        # Contact bounce: keep the first edge until the message is out
+        if self.open and not self.seen & (1 << SENT):
+            return
+        self.start = ticks_us()
+        self.open = True
+        self.seen = 1 << EDGE
+        self._record(EDGE, self.start)
+
+    def mark(self, stage: int, after: int = EDGE) -> None:
+        """Record a stage, ignored unless the stage `after` was reached"""
+        if not self.open or self.seen & (1 << stage) or not self.seen & (1 << after):
+            return
+        self.seen |= 1 << stage
+        self._record(stage, ticks_us())
+
+    def _record(self, stage: int, now: int) -> None:
+        self.ticks[self.head] = now
+        self.stages[self.head] = stage
+        self.head = (self.head + 1) % self.size
+
+        delay = ticks_diff(now, self.start)
+        if self.count[stage] < _MAX:
+            self.count[stage] += 1
+        if self.total[stage] <= _MAX - delay:
+            self.total[stage] += delay
+            self.summed[stage] += 1
+        if delay < self.min[stage]:
+            self.min[stage] = delay
+        if delay > self.max[stage]:
+            self.max[stage] = delay
+        bucket = 0
+        while delay and bucket < _BUCKETS - 1:
+            delay >>= 1
+            bucket += 1
+        if self.hist[stage * _BUCKETS + bucket] < _MAX:
+            self.hist[stage * _BUCKETS + bucket] += 1
+
+    def percentile(self, stage: int, pct: int) -> int:
+        """Upper bound in us of the bucket holding the given percentile"""
+        target = (self.count[stage] * pct + 99) // 100
+        seen = 0
+        for bucket in range(_BUCKETS):
+            seen += self.hist[stage * _BUCKETS + bucket]
+            if seen >= target:
+                return min((1 << bucket) - 1, self.max[stage])
+        return self.max[stage]
+
+    def report(self) -> None:
+        """Print the latency statistics of every stage"""
+        print("stage      count   min us   avg us   p50 us   p90 us   p99 us   max us")
+        for stage in range(_N_STAGES):
+            n = self.count[stage]
+            if not n:
+                continue
+            print(
+                f"{_STAGES[stage]:8} {n:7} {self.min[stage]:8} {self.total[stage] // max(self.summed[stage], 1):8}"
+                f" {self.percentile(stage, 50):8} {self.percentile(stage, 90):8}"
+                f" {self.percentile(stage, 99):8} {self.max[stage]:8}"
+            )
+
+    def dump(self) -> None:
+        """Print the raw ring buffer, oldest first"""
+        for i in range(self.size):
+            idx = (self.head + i) % self.size
+            if self.ticks[idx]:
+                print(_STAGES[self.stages[idx]], self.ticks[idx])
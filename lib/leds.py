@@ -0,0 +1,136 @@
+from micropython import const
+from machine import Pin, PWM, Timer
+from array import array
+
+# Envelopes
+_STEADY = const(0)
+_FADE = const(1)
+_BLINK = const(2)
+_PULSE = const(3)
+
+LEVEL_MAX = const(255)
+DUTY_MAX = const(65025)
+
+
+def gamma_table(max_duty: int = DUTY_MAX, gamma: float = 2.2):
+    """Duty for every level 0..LEVEL_MAX, perceptually even steps"""
+    return array("H", [int(max_duty * (i / LEVEL_MAX) ** gamma + 0.5) for i in range(LEVEL_MAX + 1)])
+
+
+class _Led:
+    def __init__(self, pwm: PWM) -> None:
+        self.pwm = pwm
+        self.mode = _STEADY
+        self.base = 0  # steady level
+        self.a = 0  # fade start, blink level, pulse low
+        self.b = 0  # fade target, pulse high
+        self.t = 0  # ms into the envelope
+        self.on = 0  # fade duration, blink on time, pulse period
+        self.off = 0  # blink off time
+        self.count = 0  # blinks left, 0 for endless
+        self.dim = LEVEL_MAX  # attenuation on top of the envelope
+        self.duty = 0  # last duty written
+        pwm.duty_u16(0)
+
+
+class LedEngine:
+    """PWM LEDs animated from one periodic tick with integer maths only.
+
+    Levels go from 0 to LEVEL_MAX and are mapped to PWM duties through a
+    precomputed gamma table. Each LED runs one envelope (steady, fade,
+    blink or pulse) with a dim factor on top, and its PWM is only written
+    when the duty actually changes. Call tick() every tick_ms, or start()
+    to tick from a timer.
+    """
+
+    def __init__(self, pins, max_duty: int = DUTY_MAX, tick_ms: int = 10, freq: int = 1000) -> None:
+        self.table = gamma_table(max_duty)
+        self.tick_ms = tick_ms
+        self.leds = []
+        for p in pins:
+            pwm = PWM(Pin(p, Pin.OUT))
+            pwm.freq(freq)
+            self.leds.append(_Led(pwm))
+        self._timer = None
+
+    def start(self) -> None:
+        """Tick from a dedicated timer, for programs without a scheduler"""
+        self._timer = Timer()
+        self._timer.init(mode=Timer.PERIODIC, period=self.tick_ms, callback=self._tick)
+
+    def set(self, idx: int, level: int) -> None:
+        led = self.leds[idx]
+        led.mode = _STEADY
+        led.base = level
+
+    def fade(self, idx: int, level: int, ms: int) -> None:
+        """Fade linearly from the current level to level over ms"""
+        led = self.leds[idx]
+        led.a = self.level(idx)
+        led.b = level
+        led.base = level
+        led.t = 0
+        led.on = max(ms, 1)
+        led.mode = _FADE
+
+    def blink(self, idx: int, level: int, on_ms: int, off_ms: int = 0, count: int = 1) -> None:
+        """Flash at level, count times (0 for endless), then go back to the
+        steady level"""
+        led = self.leds[idx]
+        led.a = level
+        led.t = 0
+        led.on = on_ms
+        led.off = off_ms
+        led.count = count
+        led.mode = _BLINK
+
+    def pulse(self, idx: int, low: int, high: int, period_ms: int) -> None:
+        """Breathe between low and high"""
+        led = self.leds[idx]
+        led.a = low
+        led.b = high
+        led.t = 0
+        led.on = max(period_ms, 2)
+        led.mode = _PULSE
+
+    def dim(self, idx: int, amount: int = LEVEL_MAX) -> None:
+        """Scale the LED by amount / LEVEL_MAX, LEVEL_MAX to undo"""
+        self.leds[idx].dim = amount
+
+    def level(self, idx: int) -> int:
+        """Current envelope level, without the dim factor"""
+        led = self.leds[idx]
+        mode = led.mode
+        if mode == _FADE:
+            return led.a + (led.b - led.a) * led.t // led.on
+        if mode == _BLINK:
+            return led.a if led.t % (led.on + led.off) < led.on else led.base
+        if mode == _PULSE:
+            half = led.on >> 1
+            t = led.t if led.t < half else led.on - led.t
+            return led.a + (led.b - led.a) * t // half
+        return led.base
+
+    def tick(self) -> None:
+        step = self.tick_ms
+        table = self.table
+        for i in range(len(self.leds)):
+            led = self.leds[i]
+            mode = led.mode
+            if mode != _STEADY:
+                led.t += step
+                if mode == _FADE:
+                    if led.t >= led.on:
+                        led.mode = _STEADY
+                elif mode == _BLINK:
+                    if led.count and led.t >= led.count * (led.on + led.off):
+                        led.mode = _STEADY
+                elif led.t >= led.on:
+                    led.t -= led.on
+            duty = table[self.level(i) * led.dim // LEVEL_MAX]
+            if duty != led.duty:
+                led.duty = duty
+                led.pwm.duty_u16(duty)
+
+    def _tick(self, t: Timer) -> None:
+        self.tick()
@@ -0,0 +1,507 @@
+from micropython import const
+from machine import UART, Timer
+from time import ticks_us, ticks_add, ticks_diff
+from array import array
+
+_BAUDRATE = const(31250)
+_OUT_SIZE = const(16)
+_RX_SIZE = const(32)
+_BANK_SIZE = const(8)  # bank MSB, bank LSB and program change
+_BYTE_US = const(320)  # 10 bits at 31250 baud
+
+_PPQN = const(24)
+_BPM_MIN = const(30)
+_BPM_MAX = const(300)
+_MINUTE_US = const(60_000_000)
+# Largest small int, the clock statistics stop there rather than allocate
+_MAX = const(0x3FFFFFFF)
+
+# Realtime messages
+CLOCK = const(0xF8)
+START = const(0xFA)
+CONTINUE = const(0xFB)
+STOP = const(0xFC)
+_CLOCK_MSG = b"\xf8"
+_START_MSG = b"\xfa"
+_STOP_MSG = b"\xfc"
+
+
+class MidiParser:
+    """Streaming MIDI input parser.
+
+    Feed it one byte at a time. It tracks running status, lets realtime
+    bytes (0xF8-0xFF) interleave anywhere, even inside other messages.
+    Complete messages are passed to on_message(status, data1, data2) with
+    -1 for missing data bytes, realtime bytes to on_realtime(byte).
+
+    SysEx is streamed to on_sysex(byte) as it arrives: 0xF0, the data
+    bytes, then 0xF7, or -1 when another status byte cuts it short. It is
+    skipped without on_sysex.
+    """
+
+    def __init__(self, on_message, on_realtime=None, on_sysex=None) -> None:
+        self.on_message = on_message
+        self.on_realtime = on_realtime
+        self.on_sysex = on_sysex
+        self.sysex = False
+        self.status = 0
+        self.expected = 0
+        self.data = bytearray(2)
+        self.count = 0
+
+    def feed(self, b: int) -> None:
+        if b >= 0xF8:
+            if self.on_realtime is not None:
+                self.on_realtime(b)
+            return
+        if b & 0x80:
+            self.count = 0
+            if self.sysex:
+                self.sysex = False
+                if self.on_sysex is not None:
+                    self.on_sysex(0xF7 if b == 0xF7 else -1)
+                if b == 0xF7:
+                    return
+            if b == 0xF0:
+                self.sysex = True
+                self.status = 0
+                if self.on_sysex is not None:
+                    self.on_sysex(b)
+                return
+            if b < 0xF0:
+                self.status = b
+                self.expected = 1 if 0xC0 <= b < 0xE0 else 2
+                return
+            # System common, no running status
+            self.status = 0
+            if b == 0xF1 or b == 0xF3:
+                self.status, self.expected = b, 1
+            elif b == 0xF2:
+                self.status, self.expected = b, 2
+            elif b == 0xF6:
+                self.on_message(b, -1, -1)
+            return
+        if self.sysex:
+            if self.on_sysex is not None:
+                self.on_sysex(b)
+            return
+        if self.status == 0:
+            # Stray data byte
+            return
+        self.data[self.count] = b
+        self.count += 1
+        if self.count < self.expected:
+            return
+        self.count = 0
+        status = self.status
+        if status >= 0xF0:
+            self.status = 0
+        if self.expected == 1:
+            self.on_message(status, b, -1)
+        else:
+            self.on_message(status, self.data[0], b)
+
+
+class Midi:
+    """MIDI port with a non-blocking transmit queue and optional THRU.
+
+    Messages are copied whole into a preallocated ring buffer and handed to
+    the UART by service() once it has finished sending the previous batch,
+    so callers never wait for the wire. While a program change is still
+    the last thing queued, a newer one for the same channel replaces it
+    instead of queuing behind it (coalesce). Once other messages follow
+    it, they may belong to that program, so it stays. Running status compression is optional.
+
+    Program changes can carry a bank. Bank select (CC0 and CC32) is only
+    sent when the bank differs from the last one sent on that channel, and
+    the three messages always go out together in one UART write.
+
+    With thru enabled, service() also parses the UART input. Incoming
+    messages are queued once complete, so they merge with our own messages
+    at message boundaries, and realtime bytes are forwarded immediately.
+    Incoming SysEx is not forwarded, it is streamed to on_sysex instead.
+    Our own SysEx is queued whole with write_sysex().
+
+    A clock generator reserve()s the line for its next realtime byte:
+    service() only hands the UART what is on the wire before then, so the
+    byte never waits behind a batch.
+    """
+
+    def __init__(
+        self,
+        UART_id: int,
+        channel: int = 0,
+        queue_size: int = 64,
+        running_status: bool = False,
+        coalesce: bool = True,
+        thru: bool = False,
+    ) -> None:
+        self.channel = channel
+        self.running_status = running_status
+        self.coalesce = coalesce
+        self.uart = UART(UART_id)
+        self.uart.init(baudrate=_BAUDRATE)
+
+        self._queue = bytearray(queue_size)
+        self._head = 0
+        self._tail = 0
+        self._count = 0
+        # Queue position of the pending program change data byte per channel
+        self._pc_pos = array("h", [-1] * 16)
+        # Queue position of its bank MSB data byte, -1 when it has no bank
+        self._bank_pos = array("h", [-1] * 16)
+        # Last bank queued per channel, -1 when unknown
+        self._bank = array("h", [-1] * 16)
+        self._running = 0
+
+        self._out = bytearray(_OUT_SIZE)
+        view = memoryview(self._out)
+        self._out_views = tuple(view[:i] for i in range(_OUT_SIZE + 1))
+
+        self.thru = thru
+        self.on_receive = None  # optional on_receive(status, data1, data2)
+        self.on_sysex = None  # optional on_sysex(byte), see MidiParser
+        self.parser = MidiParser(self._received, self._realtime, self._sysex)
+        self._rx = bytearray(_RX_SIZE)
+        self._receiving = False  # a callback writing must not re-enter receive()
+        self._rt = bytearray(1)
+        self._reserved = 0  # ticks_us the line has to be free at
+        self._reserving = False
+        self._line_free = ticks_us()  # when our bytes are all out
+
+        # Statistics
+        self.high_water = 0
+        self.dropped = 0
+        self.superseded = 0
+
+    def set_channel(self, channel: int):
+        if channel < 0 or channel > 15:
+            return
+        self.channel = channel
+
+    def depth(self) -> int:
+        """Number of bytes waiting in the queue"""
+        return self._count
+
+    def write_program_change(self, program: int, channel: int = -1, bank: int = -1) -> None:
+        """Queue a program change, preceded by a bank select when bank (0 to
+        16383) is given and differs from the last one sent"""
+        if channel < 0:
+            channel = self.channel
+        queue = self._queue
+        new_bank = bank >= 0 and bank != self._bank[channel]
+        pos = self._pc_pos[channel]
+        if self.coalesce and pos >= 0 and (pos + 1) % len(queue) == self._head:
+            # Nothing queued after it, like the extra messages of its preset
+            bank_pos = self._bank_pos[channel]
+            if not new_bank or bank_pos >= 0:
+                if new_bank:
+                    queue[bank_pos] = bank >> 7 & 0x7F
+                    queue[(bank_pos + 3) % len(queue)] = bank & 0x7F
+                    self._bank[channel] = bank
+                queue[pos] = program & 0x7F
+                self.superseded += 1
+                return
+
+        bank_pos = -1
+        if new_bank:
+            # The whole group or nothing
+            if self._count + _BANK_SIZE > len(queue):
+                self.dropped += 1
+                return
+            self._enqueue(0xB0 | channel, 0x00, bank >> 7 & 0x7F)
+            bank_pos = (self._head - 1) % len(queue)
+            self._enqueue(0xB0 | channel, 0x20, bank & 0x7F)
+            self._bank[channel] = bank
+        if self._enqueue(0xC0 | channel, program & 0x7F, -1):
+            self._pc_pos[channel] = (self._head - 1) % len(queue)
+            self._bank_pos[channel] = bank_pos
+        self.service()
+
+    def write_message(self, status: int, data1: int = -1, data2: int = -1) -> None:
+        """Queue any complete message, data2 is ignored for 2 byte ones"""
+        if 0xC0 <= status < 0xE0:
+            data2 = -1
+        self._enqueue(status, data1, data2)
+        self.service()
+
+    def write_sysex(self, msg, length: int = -1) -> bool:
+        """Queue a whole SysEx message, F0 to F7, from the first length bytes
+        of msg. False, and nothing queued, when it doesn't fit yet."""
+        if length < 0:
+            length = len(msg)
+        queue = self._queue
+        if self._count + length > len(queue):
+            return False
+        head = self._head
+        for i in range(length):
+            queue[head] = msg[i]
+            head = (head + 1) % len(queue)
+        self._head = head
+        self._count += length
+        if self._count > self.high_water:
+            self.high_water = self._count
+        self.service()
+        return True
+
+    def reserve(self, due_us: int) -> None:
+        """Keep the line free at ticks_us() due_us, until release()"""
+        self._reserved = due_us
+        self._reserving = True
+
+    def release(self) -> None:
+        self._reserving = False
+
+    def _enqueue(self, status: int, data1: int, data2: int) -> bool:
+        # Queue a whole message or nothing
+        size = 1 if data1 < 0 else 2 if data2 < 0 else 3
+        queue = self._queue
+        if self._count + size > len(queue):
+            self.dropped += 1
+            return False
+        if status & 0xF0 == 0xB0 and (data1 == 0x00 or data1 == 0x20):
+            # Someone else picked a bank: resend ours next time, and don't
+            # move a later program change in front of this one
+            self._bank[status & 0x0F] = -1
+            self._pc_pos[status & 0x0F] = -1
+        head = self._head
+        queue[head] = status
+        head = (head + 1) % len(queue)
+        if data1 >= 0:
+            queue[head] = data1
+            head = (head + 1) % len(queue)
+        if data2 >= 0:
+            queue[head] = data2
+            head = (head + 1) % len(queue)
+        self._head = head
+        self._count += size
+        if self._count > self.high_water:
+            self.high_water = self._count
+        return True
+
+    def _received(self, status: int, data1: int, data2: int) -> None:
+        if self.thru:
+            self._enqueue(status, data1, data2)
+        if self.on_receive is not None:
+            self.on_receive(status, data1, data2)
+
+    def _sysex(self, b: int) -> None:
+        if self.on_sysex is not None:
+            self.on_sysex(b)
+
+    def _realtime(self, b: int) -> None:
+        if self._reserving and CLOCK <= b <= STOP:
+            # Our clock owns the timing bytes while it runs
+            return
+        if self.thru:
+            # Realtime bytes may go out between any two bytes, skip the queue
+            self._rt[0] = b
+            self.uart.write(self._rt)
+
+    def receive(self) -> None:
+        """Parse whatever the UART has received so far. Callbacks may write
+        and call service(), the bytes after theirs are parsed once they
+        return."""
+        if self._receiving:
+            return
+        self._receiving = True
+        try:
+            rx = self._rx
+            while self.uart.any():
+                n = self.uart.readinto(rx)
+                if not n:
+                    return
+                for i in range(n):
+                    self.parser.feed(rx[i])
+        finally:
+            self._receiving = False
+
+    def _size(self, status: int, pos: int) -> int:
+        # Bytes of the message starting at pos, a whole bank select group
+        # for CC0
+        kind = status & 0xF0
+        if kind == 0xC0 or kind == 0xD0 or status == 0xF1 or status == 0xF3:
+            return 2
+        if status >= 0xF0 and status != 0xF2:
+            return 1
+        if kind == 0xB0 and self._queue[(pos + 1) % len(self._queue)] == 0x00:
+            return _BANK_SIZE
+        return 3
+
+    def service(self) -> None:
+        """Process input, then hand queued bytes to the UART if it is done
+        with the last batch. A queue holding more than a batch, a SysEx
+        dump say, is handed over while the last batch is still going out,
+        so the line never idles between batches."""
+        if self.thru or self.on_receive is not None or self.on_sysex is not None:
+            self.receive()
+        if self._count == 0:
+            return
+        now = ticks_us()
+        # Time our last batch still needs on the wire
+        ahead = ticks_diff(self._line_free, now)
+        if ahead < 0:
+            ahead = 0
+        if not self.uart.txdone():
+            # Short queues wait, a program change may still coalesce
+            if self._count < _OUT_SIZE or ahead >= _OUT_SIZE * _BYTE_US:
+                return
+        limit = _OUT_SIZE
+        if self._reserving:
+            # Only what is out a byte before the reserved time, the margin
+            # covers the clock interrupt being late
+            room = (ticks_diff(self._reserved, now) - ahead) // _BYTE_US - 1
+            if room < limit:
+                limit = room
+        queue = self._queue
+        out = self._out
+        tail = self._tail
+        n = 0
+        while self._count and n < limit:
+            b = queue[tail]
+            if (n or limit < _OUT_SIZE) and b & 0x80 and n + self._size(b, tail) > limit:
+                # Keep messages and bank select groups whole, the rest goes
+                # in the next batch
+                break
+            tail = (tail + 1) % len(queue)
+            self._count -= 1
+            if 0x80 <= b < 0xF0:
+                if b & 0xF0 == 0xC0:
+                    self._pc_pos[b & 0x0F] = -1
+                    self._bank_pos[b & 0x0F] = -1
+                if self.running_status and b == self._running:
+                    continue
+                self._running = b
+            elif 0xF0 <= b < 0xF8:
+                # System common messages cancel running status
+                self._running = 0
+            out[n] = b
+            n += 1
+        self._tail = tail
+        if n:
+            self.uart.write(self._out_views[n])
+            self._line_free = ticks_add(now, ahead + n * _BYTE_US)
+
+
+class MidiClock:
+    """MIDI clock generator, 24 ticks per quarter note, with tap tempo.
+
+    Tick times are absolute: the quarter note period is split into 24 whole
+    microsecond steps and the remainder is carried from tick to tick, so
+    the clock doesn't drift at any tempo. A one-shot timer is armed for each
+    tick and its callback writes 0xF8 straight to the UART, the transmit
+    queue is held back around the tick with Midi.reserve().
+
+    The timer callback is soft: it runs between two bytecodes of the main
+    program, never inside another UART write. late_max and late_total
+    measure how late it ran, in microseconds over `ticks` ticks. The total
+    and the count stop growing together before they would leave the small
+    int range, the average stays right.
+
+    tap() sets the tempo from the average of the last few taps, start() and
+    stop() send Start and Stop. Tempo changes apply from the next tick.
+    """
+
+    def __init__(self, midi: Midi, bpm: int = 120, taps: int = 4) -> None:
+        self.midi = midi
+        self.beat_us = 0  # quarter note
+        self.set_bpm(bpm)
+        self.running = False
+        self._timer = Timer()
+        self._tick_cb = self._tick  # bound once, taking a bound method allocates
+        self._due = 0
+        self._frac = 0  # 1/24 us carried over
+
+        # Tap times, a ring of the last taps + 1
+        self._taps = array("i", [0] * (taps + 1))
+        self._tap_count = 0
+
+        # Statistics
+        self.ticks = 0
+        self.late_max = 0
+        self.late_total = 0
+
+    def bpm(self) -> int:
+        return _MINUTE_US // self.beat_us
+
+    def set_bpm(self, bpm: int) -> None:
+        bpm = min(max(bpm, _BPM_MIN), _BPM_MAX)
+        self.beat_us = _MINUTE_US // bpm
+
+    def tap(self) -> None:
+        """One tap on the tempo button, the tempo follows from two on"""
+        now = ticks_us()
+        taps = self._taps
+        count = self._tap_count
+        if count and ticks_diff(now, taps[(count - 1) % len(taps)]) > _MINUTE_US // _BPM_MIN:
+            # Too slow, start over
+            count = 0
+        taps[count % len(taps)] = now
+        count += 1
+        self._tap_count = count
+        if count < 2:
+            return
+        first = count - len(taps) if count > len(taps) else 0
+        beat = ticks_diff(now, taps[first % len(taps)]) // (count - 1 - first)
+        self.beat_us = min(max(beat, _MINUTE_US // _BPM_MAX), _MINUTE_US // _BPM_MIN)
+
+    def start(self) -> None:
+        """Send Start, the first tick follows it"""
+        if self.running:
+            return
+        self._tap_count = 0
+        self.ticks = 0
+        self.late_max = 0
+        self.late_total = 0
+        self.midi.uart.write(_START_MSG)
+        self.running = True
+        self._due = ticks_add(ticks_us(), _BYTE_US)
+        self._frac = 0
+        self._arm()
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        self.running = False
+        self._timer.deinit()
+        self.midi.release()
+        self._tap_count = 0
+        self.midi.uart.write(_STOP_MSG)
+
+    def toggle(self) -> None:
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    def _tick(self, t) -> None:
+        if not self.running:
+            return
+        self.midi.uart.write(_CLOCK_MSG)
+        late = ticks_diff(ticks_us(), self._due)
+        if late > self.late_max:
+            self.late_max = late
+        if self.ticks < _MAX and self.late_total <= _MAX - late:
+            self.late_total += late
+            self.ticks += 1
+
+        beat = self.beat_us
+        frac = self._frac + beat % _PPQN
+        step = beat // _PPQN
+        if frac >= _PPQN:
+            frac -= _PPQN
+            step += 1
+        self._frac = frac
+        due = ticks_add(self._due, step)
+        self._due = due
+        self._arm()
+
+    def _arm(self) -> None:
+        self.midi.reserve(self._due)
+        delay = ticks_diff(self._due, ticks_us())
+        self._timer.init(
+            mode=Timer.ONE_SHOT,
+            period=delay if delay > 0 else 1,
+            tick_hz=1_000_000,
+            callback=self._tick_cb,
+        )
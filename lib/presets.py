@@ -0,0 +1,122 @@
+from micropython import const
+
+RECORD_SIZE = const(32)
+NAME_LEN = const(12)
+_CHANNEL = const(12)  # channel override + 1, 0 for none
+_MESSAGES = const(14)  # six (status, data1, data2) slots, status 0 is unused
+_N_MESSAGES = const(6)
+
+
+def decode_name(rec) -> str:
+    """The name at the start of a record, or of a copy of its first
+    NAME_LEN bytes"""
+    n = 0
+    while n < NAME_LEN and rec[n]:
+        n += 1
+    return str(bytes(rec[:n]), "ascii")
+
+
+class PresetStore:
+    """Per-program presets stored as fixed-width records in one file.
+
+    Record layout (RECORD_SIZE bytes): the name (NAME_LEN bytes, zero
+    padded), a channel override, and up to six extra MIDI messages sent
+    after the program change. Records are looked up by program number with
+    a single seek, and only the records of one page are kept in RAM at a
+    time, so names are read from flash when they are needed. The file stays
+    open, crossing pages only seeks and reads into the page buffer without
+    allocating. A missing file reads as empty presets.
+    """
+
+    def __init__(self, file_name: str, programs: int = 128, per_page: int = 3) -> None:
+        self.file_name = file_name
+        self.programs = programs
+        self.per_page = per_page
+        self._page = bytearray(per_page * RECORD_SIZE)
+        self._view = memoryview(self._page)
+        self._first = -1  # first program held in _page
+        self._file = None
+        self._missing = False  # don't retry open() on every page
+
+    def load_page(self, page: int) -> None:
+        """Read the records of a page of programs in one go"""
+        first = page * self.per_page
+        if first == self._first:
+            return
+        self._first = first
+        buf = self._page
+        for i in range(len(buf)):
+            buf[i] = 0
+        if self._file is None and not self._missing:
+            try:
+                self._file = open(self.file_name, "rb")
+            except OSError:
+                self._missing = True
+        if self._file is not None:
+            self._file.seek(first * RECORD_SIZE)
+            self._file.readinto(buf)
+
+    def reload(self) -> None:
+        """Close the file and forget the page held in RAM, before the file
+        is replaced or after"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._missing = False
+        self._first = -1
+
+    def record(self, program: int) -> memoryview:
+        """The raw record of a program, valid until another page is loaded"""
+        start = self._offset(program)
+        return self._view[start : start + RECORD_SIZE]
+
+    def _offset(self, program: int) -> int:
+        # Offset of the program record in _page, loading its page if needed
+        if not self._first <= program < self._first + self.per_page:
+            self.load_page(program // self.per_page)
+        return (program - self._first) * RECORD_SIZE
+
+    def has_name(self, program: int) -> bool:
+        return self._page[self._offset(program)] != 0
+
+    def name(self, program: int) -> str:
+        return decode_name(self.record(program))
+
+    def channel(self, program: int) -> int:
+        """Channel override of the program, -1 when there is none"""
+        return self._page[self._offset(program) + _CHANNEL] - 1
+
+    def write_messages(self, program: int, write) -> None:
+        """Pass the extra messages of the program to write(status, data1,
+        data2), without allocating"""
+        page = self._page
+        off = self._offset(program) + _MESSAGES
+        for i in range(_N_MESSAGES):
+            if page[off]:
+                write(page[off], page[off + 1], page[off + 2])
+            off += 3
+
+    def set(self, program: int, name: str = "", channel: int = -1, messages=()) -> None:
+        """Write the preset of a program"""
+        if not 0 <= program < self.programs:
+            raise ValueError("Program out of range")
+        if len(messages) > _N_MESSAGES:
+            raise ValueError("Too many messages")
+        rec = bytearray(RECORD_SIZE)
+        name = name.encode()[:NAME_LEN]
+        rec[: len(name)] = name
+        rec[_CHANNEL] = channel + 1 if 0 <= channel <= 15 else 0
+        for i, msg in enumerate(messages):
+            off = _MESSAGES + i * 3
+            rec[off : off + len(msg)] = bytes(msg)
+
+        self.reload()
+        try:
+            file = open(self.file_name, "r+b")
+        except OSError:
+            file = open(self.file_name, "w+b")
+            file.write(bytearray(self.programs * RECORD_SIZE))
+        with file:
+            file.seek(program * RECORD_SIZE)
+            file.write(rec)
+        self.reload()
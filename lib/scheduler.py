@@ -0,0 +1,112 @@
+from micropython import const
+from machine import Timer, idle
+from time import ticks_ms, ticks_us, ticks_diff, ticks_add
+
+# Largest small int, the statistics stop there rather than allocate
+_MAX = const(0x3FFFFFFF)
+
+
+class Task:
+    def __init__(self, name: str, func, period_ms: int, priority: int) -> None:
+        self.name = name
+        self.func = func
+        self.period = period_ms
+        self.priority = priority
+        self.pending = False
+        self.due = ticks_ms()
+
+        # Statistics
+        self.runs = 0
+        self.total_ms = 0
+        self.rest_us = 0  # below a ms, not in total_ms yet
+        self.max_us = 0
+
+
+class Scheduler:
+    """Small cooperative scheduler.
+
+    A task runs either every period_ms or once per posted event. post() and
+    post_in() only set a flag and a deadline, so they are safe to call from
+    IRQ handlers. Ready tasks run to completion, highest priority first.
+    When nothing is ready the core idles until the next interrupt, a
+    periodic tick timer makes sure it wakes up for time based work. With
+    tick_ms=0 there is no timer, for a loop that calls run_once() itself.
+
+    Run times add up in ms so the statistics stay small ints for months of
+    uptime, the run count and total then stop growing.
+    """
+
+    def __init__(self, tick_ms: int = 1) -> None:
+        self.tasks = []
+        self.started = ticks_ms()
+        self._timer = None
+        if tick_ms > 0:
+            self._timer = Timer()
+            self._timer.init(mode=Timer.PERIODIC, period=tick_ms, callback=self._wake)
+
+    def add(self, name: str, func, period_ms: int = 0, priority: int = 0) -> Task:
+        """Register func(), periodic when period_ms > 0, else event driven"""
+        task = Task(name, func, period_ms, priority)
+        i = 0
+        while i < len(self.tasks) and self.tasks[i].priority >= priority:
+            i += 1
+        self.tasks.insert(i, task)
+        return task
+
+    def post(self, task: Task) -> None:
+        """Run the task as soon as possible"""
+        task.due = ticks_ms()
+        task.pending = True
+
+    def post_in(self, task: Task, delay_ms: int) -> None:
+        """Run the task after delay_ms, replacing an earlier request"""
+        task.due = ticks_add(ticks_ms(), delay_ms)
+        task.pending = True
+
+    def cancel(self, task: Task) -> None:
+        task.pending = False
+
+    def run_once(self) -> bool:
+        """Run the highest priority ready task, False if none was ready"""
+        now = ticks_ms()
+        for task in self.tasks:
+            if not task.pending and not task.period:
+                continue
+            if ticks_diff(now, task.due) < 0:
+                continue
+            if task.period:
+                task.due = ticks_add(task.due, task.period)
+                if ticks_diff(now, task.due) >= 0:
+                    # Fell behind, don't try to catch up
+                    task.due = ticks_add(now, task.period)
+            task.pending = False
+
+            start = ticks_us()
+            task.func()
+            elapsed = ticks_diff(ticks_us(), start)
+            if task.runs < _MAX and task.total_ms < _MAX:
+                task.runs += 1
+                us = task.rest_us + elapsed
+                task.total_ms += us // 1000
+                task.rest_us = us % 1000
+            if elapsed > task.max_us:
+                task.max_us = elapsed
+            return True
+        return False
+
+    def run(self) -> None:
+        while True:
+            if not self.run_once():
+                idle()
+
+    def report(self) -> None:
+        """Print the run time spent in each task"""
+        elapsed_ms = ticks_diff(ticks_ms(), self.started) or 1
+        print("task          runs   total ms  avg us  max us  load %")
+        for task in self.tasks:
+            avg = (task.total_ms * 1000 + task.rest_us) // task.runs if task.runs else 0
+            load = task.total_ms * 100 / elapsed_ms
+            print(f"{task.name:12} {task.runs:5} {task.total_ms:10} {avg:7} {task.max_us:7} {load:7.2f}")
+
+    def _wake(self, t: Timer) -> None:
+        pass
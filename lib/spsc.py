@@ -0,0 +1,60 @@
+class SpscQueue:
+    """Lock-free queue of fixed-size records between two threads.
+
+    Exactly one thread puts and exactly one thread gets. The producer only
+    moves head and the consumer only moves tail, and each moves its index
+    after it is done with the record, so neither side needs a lock and a
+    record is never read half written. One slot is kept empty to tell a
+    full queue from an empty one.
+
+    Records are rows of a preallocated bytearray. Fill the row returned by
+    reserve() and commit() it, read the row returned by peek() and pop()
+    it. Nothing is allocated after construction.
+    """
+
+    def __init__(self, slots: int, width: int) -> None:
+        self.slots = slots + 1
+        self.width = width
+        self._buf = bytearray(self.slots * width)
+        view = memoryview(self._buf)
+        self._rows = tuple(view[i * width : (i + 1) * width] for i in range(self.slots))
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return (self.head - self.tail) % self.slots
+
+    def reserve(self):
+        """The row to fill next, or None when the queue is full"""
+        if (self.head + 1) % self.slots == self.tail:
+            self.dropped += 1
+            return None
+        return self._rows[self.head]
+
+    def commit(self) -> None:
+        """Publish the reserved row"""
+        self.head = (self.head + 1) % self.slots
+
+    def put(self, a: int, b: int = 0, c: int = 0) -> bool:
+        """Queue a record from up to three byte values"""
+        row = self.reserve()
+        if row is None:
+            return False
+        row[0] = a
+        if self.width > 1:
+            row[1] = b
+        if self.width > 2:
+            row[2] = c
+        self.commit()
+        return True
+
+    def peek(self):
+        """The oldest row, or None when the queue is empty"""
+        if self.tail == self.head:
+            return None
+        return self._rows[self.tail]
+
+    def pop(self) -> None:
+        """Release the row returned by peek()"""
+        self.tail = (self.tail + 1) % self.slots
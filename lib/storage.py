@@ -0,0 +1,97 @@
+from micropython import const
+from binascii import crc32
+from time import ticks_ms, ticks_diff
+import struct
+
+_MAGIC = const(0xA5)
+_HEAD = "<BI"  # magic, sequence number
+
+
+class RingStore:
+    """Write-behind persistence of a small fixed-size record.
+
+    Changes only mark the store dirty, the record is written once nothing
+    changed for `quiet_ms` (see poll). Records are appended round-robin to
+    `slots` fixed-size slots of a preallocated file, each with a sequence
+    number and a CRC32, and load() returns the newest valid one. The slot
+    holding the latest good record is never overwritten, so a write torn by
+    a power cut only loses that last change.
+    """
+
+    def __init__(self, file_name: str, fmt: str, snapshot, slots: int = 16, quiet_ms: int = 1000) -> None:
+        self.file_name = file_name
+        self.snapshot = snapshot  # returns the tuple of values to store
+        self.slots = slots
+        self.quiet_ms = quiet_ms
+
+        self._fmt = _HEAD + fmt
+        self._body = struct.calcsize(self._fmt)
+        self.size = self._body + 4
+        self._rec = bytearray(self.size)
+        self._body_view = memoryview(self._rec)[: self._body]
+
+        self.seq = 0
+        self.slot = 0
+        self.dirty = False
+        self.changed = 0
+        self.writes = 0
+
+    def load(self):
+        """Return the payload of the newest valid record, or None"""
+        rec = self._rec
+        best = None
+        best_slot = -1
+        try:
+            file = open(self.file_name, "rb")
+        except OSError:
+            return None
+        with file:
+            for slot in range(self.slots):
+                if file.readinto(rec) != self.size:
+                    break
+                if rec[0] != _MAGIC:
+                    continue
+                if crc32(self._body_view) != struct.unpack_from("<I", rec, self._body)[0]:
+                    continue
+                values = struct.unpack_from(self._fmt, rec)
+                if best is None or values[1] > best[1]:
+                    best = values
+                    best_slot = slot
+        if best is None:
+            return None
+        self.seq = best[1]
+        self.slot = (best_slot + 1) % self.slots
+        return best[2:]
+
+    def mark_dirty(self) -> None:
+        self.dirty = True
+        self.changed = ticks_ms()
+
+    def poll(self) -> bool:
+        """Flush if the state is dirty and has been quiet long enough"""
+        if self.dirty and ticks_diff(ticks_ms(), self.changed) >= self.quiet_ms:
+            return self.flush()
+        return False
+
+    def flush(self) -> bool:
+        """Write the current state now if it is dirty"""
+        if not self.dirty:
+            return False
+        self.dirty = False
+        self.seq += 1
+        rec = self._rec
+        struct.pack_into(self._fmt, rec, 0, _MAGIC, self.seq, *self.snapshot())
+        struct.pack_into("<I", rec, self._body, crc32(self._body_view))
+
+        try:
+            file = open(self.file_name, "r+b")
+        except OSError:
+            # First write, preallocate all the slots
+            file = open(self.file_name, "w+b")
+            file.write(bytearray(self.size * self.slots))
+        with file:
+            file.seek(self.slot * self.size)
+            file.write(rec)
+        self.slot = (self.slot + 1) % self.slots
+        self.writes += 1
+        return True
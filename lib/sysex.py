@@ -0,0 +1,297 @@
+from micropython import const
+import os
+import struct
+
+from presets import RECORD_SIZE
+
+MANUFACTURER = const(0x7D)  # non-commercial
+ALL_DEVICES = const(0x7F)
+
+# Commands, the byte after the device id
+REQUEST = const(0x01)  # to us: send a dump
+BEGIN = const(0x02)  # number of programs, payload: record size
+STATE = const(0x03)  # payload: program, page, patch as "<HHB"
+RECORD = const(0x04)  # program, payload: its preset record
+END = const(0x05)  # number of records sent
+
+_HEADER = const(6)  # F0, manufacturer, device, command, 14 bit number
+_STATE_FMT = "<HHB"
+_STATE_SIZE = const(5)
+_IDLE = const(-3)
+_READS = const(16)  # empty records skipped per service()
+
+
+def packed_size(n: int) -> int:
+    """Bytes of n bytes packed 7 bits wide"""
+    return n + (n + 6) // 7
+
+
+def pack7(src, n: int, dst, pos: int) -> int:
+    """Pack n bytes of src into dst at pos, each group of up to 7 bytes
+    preceded by a byte holding their top bits. Returns the end position."""
+    for i in range(0, n, 7):
+        top = pos
+        dst[top] = 0
+        pos += 1
+        for j in range(i, min(i + 7, n)):
+            b = src[j]
+            if b & 0x80:
+                dst[top] |= 1 << (j - i)
+            dst[pos] = b & 0x7F
+            pos += 1
+    return pos
+
+
+class SysexBackup:
+    """SysEx bulk dump and restore of the presets and the current state.
+
+    A dump is a stream of chunk messages, each of them
+
+        F0 7D device command number(2 x 7 bits) payload checksum F7
+
+    with the payload packed 7 bits wide (see pack7) and a checksum that
+    brings the sum of the number, payload and checksum bytes to 0 modulo
+    128. It goes BEGIN, STATE, one RECORD per non-empty preset in program
+    order, END. A REQUEST chunk with no number or payload starts one.
+
+    Neither side holds more than a chunk. service() queues the next chunks
+    while the MIDI queue has room for them, reading the records one at a
+    time. Incoming chunks are checked and unpacked as their bytes arrive
+    and the records written to a temporary file, which replaces the presets
+    file when the END count matches, then restore(program, page, patch) is
+    called. A bad chunk abandons the restore and the presets stay as they
+    were.
+    """
+
+    def __init__(self, midi, presets, snapshot, restore, device: int = 0, tmp_name: str = "presets.tmp") -> None:
+        self.midi = midi
+        self.presets = presets
+        self.snapshot = snapshot  # returns (program, page, patch)
+        self.restore = restore
+        self.device = device
+        self.tmp_name = tmp_name
+        midi.on_sysex = self.feed
+
+        # Dump
+        self._out = bytearray(_HEADER + packed_size(RECORD_SIZE) + 2)
+        self._out_len = 0  # chunk waiting for room in the queue
+        self._rec = bytearray(RECORD_SIZE)
+        self._next = _IDLE  # BEGIN -2, STATE -1, then programs
+        self._records = 0
+        self._dump_file = None
+
+        # Restore
+        self._pos = -1  # bytes since F0, -1 outside our messages
+        self._cmd = 0
+        self._number = 0
+        self._sum = 0
+        self._last = -1  # held back until we know it isn't the checksum
+        self._top = 0
+        self._raw = bytearray(RECORD_SIZE)
+        self._n = 0
+        self._state = bytearray(_STATE_SIZE)
+        self._has_state = False
+        self._file = None
+        self._written = 0  # records in the temporary file
+        self._received = 0
+        self._zero = bytes(RECORD_SIZE)
+
+        # Statistics
+        self.sent = 0
+        self.restored = 0
+        self.errors = 0
+
+    def dumping(self) -> bool:
+        return self._next != _IDLE
+
+    def dump(self) -> None:
+        """Start sending a dump, service() does the work"""
+        if self.dumping():
+            return
+        try:
+            self._dump_file = open(self.presets.file_name, "rb")
+        except OSError:
+            self._dump_file = None  # no presets, send the state only
+        self._next = -2
+        self._records = 0
+        self._out_len = 0
+
+    def service(self) -> None:
+        """Queue dump chunks while they fit"""
+        reads = 0
+        while self._next != _IDLE:
+            if not self._out_len:
+                if reads == _READS:
+                    return
+                reads += 1
+                self._out_len = self._build()
+                if not self._out_len:
+                    continue  # empty record
+            if not self.midi.write_sysex(self._out, self._out_len):
+                return
+            self._out_len = 0
+            self.sent += 1
+
+    def _build(self) -> int:
+        # Fill _out with the next chunk, 0 for an empty record
+        nxt = self._next
+        programs = self.presets.programs
+        rec = self._rec
+        if nxt == -2:
+            self._next = -1
+            rec[0] = RECORD_SIZE
+            return self._chunk(BEGIN, programs, 1)
+        if nxt == -1:
+            self._next = 0
+            struct.pack_into(_STATE_FMT, rec, 0, *self.snapshot())
+            return self._chunk(STATE, 0, _STATE_SIZE)
+        if nxt < programs:
+            self._next = nxt + 1
+            file = self._dump_file
+            if file is None or file.readinto(rec) != RECORD_SIZE or not any(rec):
+                return 0
+            self._records += 1
+            return self._chunk(RECORD, nxt, RECORD_SIZE)
+        self._next = _IDLE
+        if self._dump_file is not None:
+            self._dump_file.close()
+            self._dump_file = None
+        return self._chunk(END, self._records, 0)
+
+    def _chunk(self, cmd: int, number: int, n: int) -> int:
+        out = self._out
+        out[0] = 0xF0
+        out[1] = MANUFACTURER
+        out[2] = self.device
+        out[3] = cmd
+        out[4] = number >> 7 & 0x7F
+        out[5] = number & 0x7F
+        end = pack7(self._rec, n, out, _HEADER)
+        total = 0
+        for i in range(4, end):
+            total += out[i]
+        out[end] = -total & 0x7F
+        out[end + 1] = 0xF7
+        return end + 2
+
+    def feed(self, b: int) -> None:
+        """One byte of an incoming SysEx message: 0xF0, data bytes, then
+        0xF7, or -1 when something else cut the message short"""
+        if b == 0xF0:
+            self._pos = 0
+            return
+        pos = self._pos
+        if pos < 0:
+            return
+        if b == 0xF7:
+            self._pos = -1
+            self._end(pos)
+            return
+        if b < 0:
+            self._pos = -1
+            return
+        self._pos = pos + 1
+        if pos == 0:
+            if b != MANUFACTURER:
+                self._pos = -1
+        elif pos == 1:
+            if b != self.device and b != ALL_DEVICES:
+                self._pos = -1
+        elif pos == 2:
+            self._cmd = b
+            self._number = 0
+            self._sum = 0
+            self._last = -1
+            self._n = 0
+        else:
+            self._sum += b
+            if pos < 5:
+                self._number = self._number << 7 | b
+                return
+            last = self._last
+            self._last = b
+            if last >= 0:
+                self._unpack(pos - 6, last)
+
+    def _unpack(self, i: int, b: int) -> None:
+        # Payload byte i of the message
+        group = i & 7
+        if group == 0:
+            self._top = b
+            return
+        n = self._n
+        if n == len(self._raw):
+            self._n = n + 1  # too long, caught by _end
+            return
+        if self._top >> (group - 1) & 1:
+            b |= 0x80
+        self._raw[n] = b
+        self._n = n + 1
+
+    def _end(self, pos: int) -> None:
+        cmd = self._cmd
+        if pos == 3 and cmd == REQUEST:
+            self.dump()
+            return
+        if pos < 6 or self._sum & 0x7F or self._n > len(self._raw):
+            self._fail()
+            return
+        if cmd == BEGIN:
+            self._begin()
+        elif self._file is None:
+            return  # not restoring
+        elif cmd == STATE and self._n == _STATE_SIZE:
+            self._state[:] = self._raw[:_STATE_SIZE]
+            self._has_state = True
+        elif cmd == RECORD and self._n == RECORD_SIZE and self._written <= self._number < self.presets.programs:
+            self._pad(self._number)
+            self._file.write(self._raw)
+            self._written += 1
+            self._received += 1
+        elif cmd == END and self._number == self._received:
+            self._finish()
+        else:
+            self._fail()
+
+    def _begin(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        if self._number != self.presets.programs or self._n != 1 or self._raw[0] != RECORD_SIZE:
+            self._file = None
+            self.errors += 1
+            return
+        self._file = open(self.tmp_name, "wb")
+        self._written = 0
+        self._received = 0
+        self._has_state = False
+
+    def _pad(self, count: int) -> None:
+        # Empty records up to program count
+        while self._written < count:
+            self._file.write(self._zero)
+            self._written += 1
+
+    def _finish(self) -> None:
+        self._pad(self.presets.programs)
+        self._file.close()
+        self._file = None
+        self.presets.reload()  # closes the presets file
+        try:
+            os.remove(self.presets.file_name)
+        except OSError:
+            pass
+        os.rename(self.tmp_name, self.presets.file_name)
+        self.restored += 1
+        if self._has_state:
+            self.restore(*struct.unpack(_STATE_FMT, self._state))
+
+    def _fail(self) -> None:
+        self.errors += 1
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        try:
+            os.remove(self.tmp_name)
+        except OSError:
+            pass
@@ -0,0 +1,874 @@
+"""
+MicroPython TM1637 quad 7-segment LED display driver
+https://github.com/mcauser/micropython-tm1637
+
+MIT License
+Copyright (c) 2016-2023 Mike Causer
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__version__ = '1.3.0'
+
+from micropython import const
+from machine import Pin, Timer
+from time import sleep_us, sleep_ms, ticks_ms, ticks_diff
+
+try:
+    import rp2
+except ImportError:
+    rp2 = None
+
+try:
+    from machine import mem32
+except ImportError:
+    mem32 = None
+
+_SIO_GPIO_OUT_SET = const(0xD0000014) # RP2040 SIO registers
+_SIO_GPIO_OUT_CLR = const(0xD0000018)
+
+TM1637_CMD1 = const(64)  # 0x40 data command
+TM1637_FIXED = const(4)  # 0x04 fixed address mode (data command flag)
+TM1637_CMD2 = const(192) # 0xC0 address command
+TM1637_CMD3 = const(128) # 0x80 display control command
+TM1637_DSP_ON = const(8) # 0x08 display on
+TM1637_DELAY = const(10) # default 10us delay between clk/dio pulses
+TM1637_MSB = const(128)  # msb is the decimal point or the colon depending on your display
+
+# 0-9, a-z, blank, dash, star
+_SEGMENTS = bytearray(b'\x3F\x06\x5B\x4F\x66\x6D\x7D\x07\x7F\x6F\x77\x7C\x39\x5E\x79\x71\x3D\x76\x06\x1E\x76\x38\x55\x54\x3F\x73\x67\x50\x6D\x78\x3E\x1C\x2A\x76\x6E\x5B\x00\x40\x63')
+
+def _ascii_table():
+    # ASCII code to segments, 0xff marks characters that can't be displayed
+    table = bytearray(b'\xff' * 128)
+    table[32] = _SEGMENTS[36] # space
+    table[42] = _SEGMENTS[38] # star/degrees
+    table[45] = _SEGMENTS[37] # dash
+    for i in range(10):
+        table[48 + i] = _SEGMENTS[i] # 0-9
+    for i in range(26):
+        table[65 + i] = _SEGMENTS[10 + i] # uppercase A-Z
+        table[97 + i] = _SEGMENTS[10 + i] # lowercase a-z
+    return table
+
+_ASCII = _ascii_table()
+
+class TM1637(object):
+    """Library for quad 7-segment LED modules based on the TM1637 LED driver."""
+    def __init__(self, clk, dio, brightness=7, delay=TM1637_DELAY):
+        self.clk = clk
+        self.dio = dio
+        # bus delay in us, see calibrate()
+        self.delay = delay
+        self._check_ack = False
+        self.nacks = 0
+        self._init_state(brightness)
+
+        self.clk.init(Pin.OUT, value=0)
+        self.dio.init(Pin.OUT, value=0)
+        sleep_us(self.delay)
+
+        self._write_data_cmd()
+        self._write_dsp_ctrl()
+
+    def _init_state(self, brightness):
+        if not 0 <= brightness <= 7:
+            raise ValueError("Brightness out of range")
+        self._brightness = brightness
+
+        # shadow copy of the display RAM, one bit per digit in _known marks
+        # the digits whose content on the module is known to match _frame
+        self._frame = bytearray(6)
+        self._known = 0
+        # last data command mode and display control byte sent, -1 unknown
+        self._mode = -1
+        self._ctrl = -1
+
+        # scratch frame for number/numbers/show, with a view per length
+        self._buf = bytearray(4)
+        view = memoryview(self._buf)
+        self._views = tuple(view[:i] for i in range(5))
+        # optional FrameCache used by number() for the values it covers
+        self.number_cache = None
+
+        # non-blocking scroll state, the window is reused for every frame
+        self._window = bytearray(4)
+        self._scroll = None
+        self._scroll_timer = None
+        self._scroll_cb = self._scroll_tick
+
+        # bus statistics
+        self.transactions = 0
+        self.bytes_sent = 0
+        self.bytes_saved = 0
+
+    def _start(self):
+        self.transactions += 1
+        self.dio(0)
+        sleep_us(self.delay)
+        self.clk(0)
+        sleep_us(self.delay)
+
+    def _stop(self):
+        self.dio(0)
+        sleep_us(self.delay)
+        self.clk(1)
+        sleep_us(self.delay)
+        self.dio(1)
+
+    def _write_data_cmd(self, mode=0):
+        # automatic address increment (or fixed address), normal mode, only
+        # sent when it changes: the module keeps it
+        if mode == self._mode:
+            return
+        self._mode = mode
+        self._start()
+        self._write_byte(TM1637_CMD1 | mode)
+        self._stop()
+
+    def _write_dsp_ctrl(self):
+        # display on, set brightness, only sent when it changes
+        ctrl = TM1637_CMD3 | TM1637_DSP_ON | self._brightness
+        if ctrl == self._ctrl:
+            return
+        self._ctrl = ctrl
+        self._start()
+        self._write_byte(ctrl)
+        self._stop()
+
+    def _write_byte(self, b):
+        self.bytes_sent += 1
+        clk = self.clk
+        dio = self.dio
+        delay = self.delay
+        # data is set up while CLK is low and sampled on the rising edge
+        for i in range(8):
+            dio((b >> i) & 1)
+            sleep_us(delay)
+            clk(1)
+            sleep_us(delay)
+            clk(0)
+        # ninth clock, the module acknowledges by pulling DIO low
+        check = self._check_ack
+        if check:
+            dio.init(Pin.IN, Pin.PULL_UP)
+        sleep_us(delay)
+        clk(1)
+        sleep_us(delay)
+        if check and dio():
+            self.nacks += 1
+        clk(0)
+        if check:
+            dio.init(Pin.OUT, value=0)
+
+    def resync(self):
+        """Forget what the module is known to hold, e.g. after it was
+        reconnected: the next write sends everything again."""
+        self._known = 0
+        self._mode = -1
+        self._ctrl = -1
+        self._write_data_cmd()
+        self._write_dsp_ctrl()
+
+    def calibrate(self, delays=(0, 1, 2, 5, 10), tries=8):
+        """Find the shortest bus delay at which the module acknowledges
+        every byte and keep it. Returns the delay, or None when no delay
+        works (no module attached) and the old one is kept."""
+        old = self.delay
+        self._check_ack = True
+        try:
+            for delay in sorted(delays):
+                self.delay = delay
+                self.nacks = 0
+                for _ in range(tries):
+                    self._mode = -1
+                    self._ctrl = -1
+                    self._write_data_cmd()
+                    self._write_dsp_ctrl()
+                if not self.nacks:
+                    return delay
+        finally:
+            self._check_ack = False
+        self.delay = old
+        return None
+
+    def brightness(self, val=None):
+        """Set the display brightness 0-7."""
+        # brightness 0 = 1/16th pulse width
+        # brightness 7 = 14/16th pulse width
+        if val is None:
+            return self._brightness
+        if not 0 <= val <= 7:
+            raise ValueError("Brightness out of range")
+
+        self._brightness = val
+        self._write_dsp_ctrl()
+
+    def write(self, segments, pos=0):
+        """Display up to 6 segments moving right from a given position.
+        The MSB in the 2nd segment controls the colon between the 2nd
+        and 3rd segments.
+
+        Only the digits that differ from the last frame written are sent,
+        identical frames do not touch the bus at all. A running scroll is
+        cancelled."""
+        if self._scroll is not None:
+            self.stop_scroll()
+        self._write(segments, pos)
+
+    def _write(self, segments, pos=0):
+        if not 0 <= pos <= 5:
+            raise ValueError("Position out of range")
+        frame = self._frame
+        n = min(len(segments), 6 - pos)
+        # a full write costs data cmd, address, digits and display control
+        full = n + 3
+
+        # find the dirty digit range against the shadow frame
+        first = -1
+        last = 0
+        dirty = 0
+        for i in range(n):
+            addr = pos + i
+            if frame[addr] != segments[i] or not self._known & (1 << addr):
+                if first < 0:
+                    first = i
+                last = i
+                dirty += 1
+        if first < 0:
+            self.bytes_saved += full
+            return
+
+        sent = self.bytes_sent
+        if 2 * dirty <= last - first + 2:
+            # few scattered digits: one address + byte pair per dirty digit
+            self._write_data_cmd(TM1637_FIXED)
+            for i in range(first, last + 1):
+                addr = pos + i
+                seg = segments[i]
+                if frame[addr] != seg or not self._known & (1 << addr):
+                    self._start()
+                    self._write_byte(TM1637_CMD2 | addr)
+                    self._write_byte(seg)
+                    self._stop()
+                    frame[addr] = seg
+                    self._known |= 1 << addr
+        else:
+            # contiguous range: automatic address increment from the first one
+            self._write_data_cmd()
+            self._start()
+            self._write_byte(TM1637_CMD2 | (pos + first))
+            for i in range(first, last + 1):
+                seg = segments[i]
+                self._write_byte(seg)
+                frame[pos + i] = seg
+                self._known |= 1 << (pos + i)
+            self._stop()
+        self._write_dsp_ctrl()
+        self.bytes_saved += full - (self.bytes_sent - sent)
+
+    def reset_stats(self):
+        """Clear the bus transaction and byte counters."""
+        self.transactions = 0
+        self.bytes_sent = 0
+        self.bytes_saved = 0
+
+    def encode_digit(self, digit):
+        """Convert a character 0-9, a-f to a segment."""
+        return _SEGMENTS[digit & 0x0f]
+
+    def encode_string(self, string):
+        """Convert an up to 4 character length string containing 0-9, a-z,
+        space, dash, star to an array of segments, matching the length of the
+        source string."""
+        segments = bytearray(len(string))
+        self._encode_into(string, segments)
+        return segments
+
+    def _encode_into(self, string, buf):
+        # encode as many characters as fit in buf, return the segment count
+        n = min(len(string), len(buf))
+        for i in range(n):
+            buf[i] = self.encode_char(string[i])
+        return n
+
+    def encode_char(self, char):
+        """Convert a character 0-9, a-z, space, dash or star to a segment."""
+        o = ord(char)
+        seg = _ASCII[o] if o < 128 else 0xff
+        if seg == 0xff:
+            raise ValueError("Character out of range: {:d} '{:s}'".format(o, chr(o)))
+        return seg
+
+    def _encode_number(self, num, start, width):
+        # right aligned, blank padded decimal straight into the scratch frame
+        buf = self._buf
+        neg = num < 0
+        if neg:
+            num = -num
+        i = start + width - 1
+        while True:
+            buf[i] = _SEGMENTS[num % 10]
+            num //= 10
+            i -= 1
+            if num == 0 or i < start:
+                break
+        if neg and i >= start:
+            buf[i] = _SEGMENTS[37] # dash
+            i -= 1
+        while i >= start:
+            buf[i] = 0
+            i -= 1
+
+    def hex(self, val):
+        """Display a hex value 0x0000 through 0xffff, right aligned."""
+        string = '{:04x}'.format(val & 0xffff)
+        self.write(self._views[self._encode_into(string, self._buf)])
+
+    def number(self, num):
+        """Display a numeric value -999 through 9999, right aligned."""
+        # limit to range -999 to 9999
+        num = max(-999, min(num, 9999))
+        cache = self.number_cache
+        if cache is not None and cache.copy(num, self._buf):
+            self.write(self._buf)
+            return
+        self._encode_number(num, 0, 4)
+        self.write(self._buf)
+
+    def cache_numbers(self, first, last):
+        """Pre-render number() frames for first..last, showing one of them
+        becomes a table lookup."""
+        self.number_cache = FrameCache(self, first, last)
+
+    def numbers(self, num1, num2, colon=True):
+        """Display two numeric values -9 through 99, with leading zeros
+        and separated by a colon."""
+        num1 = max(-9, min(num1, 99))
+        num2 = max(-9, min(num2, 99))
+        buf = self._buf
+        for i, num in ((0, num1), (2, num2)):
+            if num < 0:
+                buf[i] = _SEGMENTS[37] # dash
+                buf[i + 1] = _SEGMENTS[-num]
+            else:
+                buf[i] = _SEGMENTS[num // 10]
+                buf[i + 1] = _SEGMENTS[num % 10]
+        if colon:
+            buf[1] |= 0x80 # colon on
+        self.write(buf)
+
+    def temperature(self, num):
+        if num < -9:
+            self.show('lo') # low
+        elif num > 99:
+            self.show('hi') # high
+        else:
+            string = '{0: >2d}'.format(num)
+            self.write(self.encode_string(string))
+        self.write([_SEGMENTS[38], _SEGMENTS[12]], 2) # degrees C
+
+    def show(self, string, colon=False):
+        n = self._encode_into(string, self._buf)
+        if n > 1 and colon:
+            self._buf[1] |= 128
+        self.write(self._views[n])
+
+    def scroll(self, string, delay=250, timer=None):
+        """Scroll a string or a list of segments across the display.
+
+        Blocks until the text has scrolled through, unless a Timer is given:
+        the timer then advances one frame every delay ms and the call
+        returns right away."""
+        self.scroll_start(string)
+        if timer is None:
+            while self.scroll_step():
+                sleep_ms(delay)
+            return
+        self._scroll_timer = timer
+        timer.init(mode=Timer.PERIODIC, period=delay, callback=self._scroll_cb)
+
+    def scroll_start(self, string):
+        """Prepare a scroll without showing anything, every scroll_step()
+        call then displays the next frame."""
+        self.stop_scroll()
+        segments = self.encode_string(string) if isinstance(string, str) else string
+        self._scroll = self._scroll_frames(segments)
+
+    def scroll_step(self):
+        """Display the next scroll frame. Returns False once the scroll is
+        over (or was cancelled)."""
+        frames = self._scroll
+        if frames is None:
+            return False
+        for frame in frames:
+            self._write(frame)
+            return True
+        self.stop_scroll()
+        return False
+
+    def stop_scroll(self):
+        """Cancel a running scroll, the display keeps the current frame."""
+        self._scroll = None
+        if self._scroll_timer is not None:
+            self._scroll_timer.deinit()
+            self._scroll_timer = None
+
+    async def scroll_async(self, string, delay=250):
+        """Scroll from an asyncio task, yielding between frames."""
+        import asyncio
+        self.scroll_start(string)
+        while self.scroll_step():
+            await asyncio.sleep_ms(delay)
+
+    def _scroll_tick(self, t):
+        self.scroll_step()
+
+    def _scroll_frames(self, segments):
+        # slide a 4 digit window over 4 blanks, the segments and 4 blanks
+        window = self._window
+        n = len(segments)
+        for i in range(n + 5):
+            for j in range(4):
+                k = i + j - 4
+                window[j] = segments[k] if 0 <= k < n else 0
+            yield window
+
+
+if rp2 is not None:
+    # One FIFO word per byte: bit 0 start condition, bits 1-8 data (lsb
+    # first), bit 9 stop condition. CLK is the side-set pin, DIO is driven by
+    # out/set and released during the ack clock.
+    @rp2.asm_pio(
+        sideset_init=rp2.PIO.OUT_HIGH,
+        out_init=rp2.PIO.OUT_HIGH,
+        set_init=rp2.PIO.OUT_HIGH,
+        out_shiftdir=rp2.PIO.SHIFT_RIGHT,
+        fifo_join=rp2.PIO.JOIN_TX,
+    )
+    def _tm1637_pio():
+        wrap_target()
+        pull(block)             .side(1)        # bus idle, CLK and DIO high
+        out(x, 1)               .side(1)
+        jmp(not_x, "byte")      .side(1)
+        set(pins, 0)            .side(1) [7]    # start: DIO falls while CLK high
+        label("byte")
+        set(y, 7)               .side(0) [7]
+        label("bit")
+        out(pins, 1)            .side(0) [7]
+        nop()                   .side(1) [7]
+        jmp(y_dec, "bit")       .side(0) [7]
+        set(pindirs, 0)         .side(0) [7]    # release DIO for the ack clock
+        nop()                   .side(1) [7]
+        set(pindirs, 1)         .side(0) [7]
+        out(x, 1)               .side(0)
+        jmp(not_x, "next")      .side(0)
+        set(pins, 0)            .side(0) [7]    # stop: DIO rises while CLK high
+        nop()                   .side(1) [7]
+        set(pins, 1)            .side(1) [7]
+        wrap()
+        label("next")
+        pull(block)             .side(0)        # more bytes, keep CLK low
+        out(x, 1)               .side(0)
+        jmp("byte")             .side(0)
+
+
+class TM1637PIO(TM1637):
+    """TM1637 driver that hands the bus to an rp2 PIO state machine.
+
+    Every byte is pushed into the state machine TX FIFO and clocked out in
+    the background, so write() returns as soon as the frame is queued.
+    Falls back to the bit-banged bus when PIO is not available."""
+    def __init__(self, clk, dio, brightness=7, sm_id=0, freq=1000000, delay=TM1637_DELAY):
+        self._sm = None
+        self._flags = 0
+        self._held = -1
+        # the init commands are bit-banged, PIO takes the pins over afterwards
+        super().__init__(clk, dio, brightness, delay)
+
+        if rp2 is None:
+            return
+        try:
+            sm = rp2.StateMachine(sm_id, _tm1637_pio, freq=freq,
+                                  sideset_base=clk, out_base=dio, set_base=dio)
+        except (ValueError, OSError):
+            return
+        sm.active(1)
+        self._sm = sm
+
+    def calibrate(self, delays=(0, 1, 2, 5, 10), tries=8):
+        """Only for the bit-banged fallback, the PIO bus speed is set by
+        freq. Returns None when PIO drives the bus."""
+        if self._sm is None:
+            return super().calibrate(delays, tries)
+        return None
+
+    def _start(self):
+        if self._sm is None:
+            return super()._start()
+        self.transactions += 1
+        self._flags = 1
+
+    def _stop(self):
+        if self._sm is None:
+            return super()._stop()
+        # the held byte is the last one of the transaction
+        self._sm.put(self._held | 0x200)
+        self._held = -1
+
+    def _write_byte(self, b):
+        if self._sm is None:
+            return super()._write_byte(b)
+        self.bytes_sent += 1
+        if self._held >= 0:
+            self._sm.put(self._held)
+        self._held = (b << 1) | self._flags
+        self._flags = 0
+
+
+class TM1637Decimal(TM1637):
+    """Library for quad 7-segment LED modules based on the TM1637 LED driver.
+
+    This class is meant to be used with decimal display modules (modules
+    that have a decimal point after each 7-segment LED).
+    """
+
+    def encode_string(self, string):
+        """Convert a string to LED segments.
+
+        Convert an up to 4 character length string containing 0-9, a-z,
+        space, dash, star and '.' to an array of segments, matching the length of
+        the source string."""
+        segments = bytearray(len(string.replace('.','')))
+        self._encode_into(string, segments)
+        return segments
+
+    def _encode_into(self, string, buf):
+        j = 0
+        for i in range(len(string)):
+            if string[i] == '.' and j > 0:
+                buf[j-1] |= TM1637_MSB
+                continue
+            if j == len(buf):
+                break
+            buf[j] = self.encode_char(string[i])
+            j += 1
+        return j
+
+
+class _GroupMember(TM1637):
+    """One display of a TM1637Group. It has the whole TM1637 API, but its
+    writes only stage a frame until the group clocks it out."""
+    def __init__(self, group, index, dio):
+        self.group = group
+        self.index = index
+        self.clk = None
+        self.dio = dio
+        self.delay = group.delay
+        self._check_ack = False
+        self.nacks = 0
+        self._init_state(group._brightness)
+        # frame to show, one bit per digit in _want marks the staged digits
+        self._next = bytearray(6)
+        self._want = 0
+
+    def _write(self, segments, pos=0):
+        if not 0 <= pos <= 5:
+            raise ValueError("Position out of range")
+        n = min(len(segments), 6 - pos)
+        frame = self._next
+        for i in range(n):
+            frame[pos + i] = segments[i]
+            self._want |= 1 << (pos + i)
+        self.group._staged |= 1 << self.index
+
+    def brightness(self, val=None):
+        """The brightness is shared by the whole group."""
+        return self.group.brightness(val)
+
+    def calibrate(self, delays=(0, 1, 2, 5, 10), tries=8):
+        """Not supported, the group delay applies."""
+        return None
+
+    def resync(self):
+        """Send every digit again with the next group update."""
+        self._known = 0
+        self.group._staged |= 1 << self.index
+
+
+class TM1637Group(object):
+    """Several TM1637 modules sharing one CLK line, each with its own DIO.
+
+    displays[i] has the TM1637 API (number, show, scroll, FrameCache,
+    FrameSlot...) with its own shadow frame, but its writes only stage the
+    frame: update() then sends the changes of all the displays together.
+    Every CLK edge and every data bit of all the DIO lines at once is a
+    single write to the RP2040 SIO set or clear register, so updating four
+    displays costs about as much as updating one. Displays with nothing to
+    change keep DIO high and ignore the transfer.
+
+    clk and dios are GPIO numbers."""
+    def __init__(self, clk, dios, brightness=7, delay=TM1637_DELAY):
+        if not 0 <= brightness <= 7:
+            raise ValueError("Brightness out of range")
+        self.delay = delay
+        self._brightness = brightness
+
+        # bus idles with CLK and DIO high
+        self._clk = 1 << clk
+        self._pins = [(self._clk, Pin(clk, Pin.OUT, value=1))]
+        self._masks = []
+        self._lines = 0
+        for gpio in dios:
+            self._pins.append((1 << gpio, Pin(gpio, Pin.OUT, value=1)))
+            self._masks.append(1 << gpio)
+            self._lines |= 1 << gpio
+        self.displays = [_GroupMember(self, i, self._pins[i + 1][1])
+                         for i in range(len(dios))]
+        self._staged = 0 # one bit per display with staged digits
+        self._out = bytearray(len(dios)) # next byte for each display
+
+        # bus statistics, a byte sent to several displays counts once
+        self.transactions = 0
+        self.bytes_sent = 0
+
+        self._command(TM1637_CMD1)
+        self._command(TM1637_CMD3 | TM1637_DSP_ON | brightness)
+
+    def brightness(self, val=None):
+        """Set the brightness 0-7 of all the displays."""
+        if val is None:
+            return self._brightness
+        if not 0 <= val <= 7:
+            raise ValueError("Brightness out of range")
+        self._brightness = val
+        self._command(TM1637_CMD3 | TM1637_DSP_ON | val)
+
+    def update(self):
+        """Send the staged digits of every display in one transfer over
+        the union of their dirty ranges. Returns False when nothing
+        changed."""
+        displays = self.displays
+        first = 6
+        last = -1
+        lines = 0
+        for i in range(len(displays)):
+            if not self._staged & (1 << i):
+                continue
+            disp = displays[i]
+            for addr in range(6):
+                bit = 1 << addr
+                if disp._want & bit and (disp._next[addr] != disp._frame[addr]
+                                         or not disp._known & bit):
+                    first = min(first, addr)
+                    last = max(last, addr)
+                    lines |= self._masks[i]
+        self._staged = 0
+        if not lines:
+            return False
+
+        out = self._out
+        for i in range(len(out)):
+            out[i] = TM1637_CMD2 | first
+        self._start(lines)
+        self._write_bytes(lines, out)
+        for addr in range(first, last + 1):
+            bit = 1 << addr
+            for i in range(len(displays)):
+                if lines & self._masks[i]:
+                    disp = displays[i]
+                    seg = disp._next[addr] if disp._want & bit else disp._frame[addr]
+                    out[i] = seg
+                    disp._frame[addr] = seg
+                    disp._known |= bit
+            self._write_bytes(lines, out)
+        self._stop(lines)
+        return True
+
+    def _command(self, cmd):
+        # one command byte to every display
+        out = self._out
+        for i in range(len(out)):
+            out[i] = cmd
+        self._start(self._lines)
+        self._write_bytes(self._lines, out)
+        self._stop(self._lines)
+
+    def _set(self, mask):
+        if mem32 is not None:
+            mem32[_SIO_GPIO_OUT_SET] = mask
+            return
+        for bit, pin in self._pins:
+            if mask & bit:
+                pin(1)
+
+    def _clr(self, mask):
+        if mem32 is not None:
+            mem32[_SIO_GPIO_OUT_CLR] = mask
+            return
+        for bit, pin in self._pins:
+            if mask & bit:
+                pin(0)
+
+    def _start(self, lines):
+        self.transactions += 1
+        self._clr(lines)
+        sleep_us(self.delay)
+        self._clr(self._clk)
+        sleep_us(self.delay)
+
+    def _stop(self, lines):
+        self._clr(lines)
+        sleep_us(self.delay)
+        self._set(self._clk)
+        sleep_us(self.delay)
+        self._set(lines)
+
+    def _write_bytes(self, lines, out):
+        # out[i] goes to display i, only the displays on lines listen
+        self.bytes_sent += 1
+        masks = self._masks
+        clk = self._clk
+        delay = self.delay
+        for b in range(8):
+            high = 0
+            for i in range(len(masks)):
+                if out[i] >> b & 1:
+                    high |= masks[i]
+            high &= lines
+            self._clr(lines & ~high)
+            self._set(high)
+            sleep_us(delay)
+            self._set(clk)
+            sleep_us(delay)
+            self._clr(clk)
+        # ack clock
+        sleep_us(delay)
+        self._set(clk)
+        sleep_us(delay)
+        self._clr(clk)
+
+
+class FrameCache(object):
+    """Pre-rendered frames for a contiguous range of integers.
+
+    Each value is formatted and encoded once up front into a single
+    bytearray, 4 bytes per value, showing it later copies its 4 bytes with
+    no string formatting or allocation."""
+    def __init__(self, disp, first, last, fmt='{0: >4d}'):
+        self.disp = disp
+        self.first = first
+        self.last = last
+        self.frames = bytearray(4 * (last - first + 1))
+        view = memoryview(self.frames)
+        for v in range(first, last + 1):
+            i = 4 * (v - first)
+            disp._encode_into(fmt.format(v), view[i:i + 4])
+
+    def offset(self, value):
+        """Start of the frame of a cached value in frames, -1 when it is
+        out of range."""
+        if not self.first <= value <= self.last:
+            return -1
+        return 4 * (value - self.first)
+
+    def copy(self, value, buf):
+        """Copy the frame of a cached value into buf, returns False when it
+        is out of range."""
+        i = self.offset(value)
+        if i < 0:
+            return False
+        frames = self.frames
+        for j in range(4):
+            buf[j] = frames[i + j]
+        return True
+
+    def show(self, value):
+        """Display a cached value, returns False when it is out of range."""
+        disp = self.disp
+        if not self.copy(value, disp._buf):
+            return False
+        disp.write(disp._buf)
+        return True
+
+
+class FrameSlot(object):
+    """Latest-value-wins frame buffer in front of a display.
+
+    set() only copies a 4 digit frame into the slot, replacing one that has
+    not been sent yet. refresh() sends the newest frame, at most max_fps
+    times a second, so a burst of updates costs one bus transfer per frame
+    period and always ends on the last frame. Scrolls run through the slot
+    as well."""
+    def __init__(self, disp, max_fps=10):
+        self.disp = disp
+        self.period = 1000 // max_fps
+        self._frame = bytearray(4)
+        self._scroll = None
+        self.pending = False
+        self.last = ticks_ms() - self.period
+        self.sent = 0
+        self.dropped = 0
+
+    def set(self, segments, start=0):
+        """Make segments (up to 4 from start) the next frame, cancels a
+        scroll."""
+        self._scroll = None
+        self._set(segments, start)
+
+    def _set(self, segments, start=0):
+        frame = self._frame
+        n = len(segments) - start
+        for i in range(4):
+            frame[i] = segments[start + i] if i < n else 0
+        if self.pending:
+            self.dropped += 1
+        self.pending = True
+
+    def show(self, string):
+        self.set(self.disp.encode_string(string))
+
+    def scroll_start(self, string):
+        """Like TM1637.scroll_start(), each scroll_step() sets a frame."""
+        segments = self.disp.encode_string(string) if isinstance(string, str) else string
+        self._scroll = self.disp._scroll_frames(segments)
+
+    def scroll_step(self):
+        frames = self._scroll
+        if frames is None:
+            return False
+        for frame in frames:
+            self._set(frame)
+            return True
+        self._scroll = None
+        return False
+
+    def refresh(self):
+        """Send the pending frame if the rate allows. Returns the ms to wait
+        before calling again, 0 when nothing is left to send."""
+        if not self.pending:
+            return 0
+        wait = self.period - ticks_diff(ticks_ms(), self.last)
+        if wait > 0:
+            return wait
+        self.pending = False
+        self.last = ticks_ms()
+        self.sent += 1
+        self.disp.write(self._frame)
+        return 0
@@ -1,176 +1,572 @@
 import tm1637
-from machine import Pin, Timer, PWM, UART
-import math
-import json
+import storage
+import latency
+from midi import Midi, MidiClock
+from scheduler import Scheduler
+from inputs import ButtonScanner, KeyMatrix, PRESS, RELEASE, HOLD, REPEAT
+from presets import PresetStore, NAME_LEN, decode_name
+from leds import LedEngine
+from spsc import SpscQueue
+from sysex import SysexBackup
+from machine import Pin
+from micropython import const
+from time import sleep_ms
+from array import array
+import micropython
+import gc
+import select
+import sys
 
 # Pins
 p_patch_btn = [6, 7, 8]
 p_patch_led = [18, 19, 20]
 p_page_up = 10
 p_page_down = 9
+p_tap_btn = 11
 p_send_led = 21
 p_disp_clk = 26
 p_disp_dio = 27
+# A footswitch matrix replaces p_patch_btn once it has rows and columns.
+# Rows are driven open drain, columns have pull-ups, e.g. rows [2, 3, 4, 5]
+# and columns [12, 13, 14, 15] for a 4x4 board
+p_matrix_rows = []
+p_matrix_cols = []
+k_matrix_diodes = False  # a diode per key, no ghosting to handle
 # Other constants
 k_midi_uart_id = 0
-k_pages = math.ceil(127 / len(p_patch_btn))
-k_file_name = "data.json"
-k_pwm_max = 65025
+# Banks of 128 programs, selected with CC0/CC32
+k_banks = 8
+k_programs = k_banks * 128
+# Patch buttons per page, the first keys of the matrix or p_patch_btn
+k_patches = len(p_matrix_rows) * len(p_matrix_cols) or len(p_patch_btn)
+k_pages = (k_programs + k_patches - 1) // k_patches
+k_file_name = "data.log"
+k_legacy_file_name = "data.json"
+k_presets_file_name = "presets.bin"
+k_scroll_ms = 300
+k_display_fps = 10
+k_save_quiet_ms = 2000
+k_scan_period_ms = 2
+k_debounce_samples = 5
+# Holding page up/down repeats, faster and faster
+k_page_repeat_delay_ms = 300
+k_page_repeat_ms = 100
+k_page_repeat_min_ms = 2
+k_page_repeat_accel = 60  # percent of the previous interval
+# The program of a new page is sent once the page buttons are left alone
+k_page_settle_ms = 250
 k_midi_channel = 0
-k_led_high_brightness = 0.2
-k_led_low_brightness = 0.05
-
-
-def pwm_duty(ratio: float) -> int:
-    """Calculate PWM duty cycle from a ratio (0.0 to 1.0)"""
-    return int(k_pwm_max * max(min(ratio, 1.0), 0.0))
-
-
-class Midi:
-    def __init__(self, UART_id: int) -> None:
-        self.channel = k_midi_channel
-        self.uart = UART(UART_id)
-        self.uart.init(baudrate=31250)
-
-    def set_channel(self, channel: int):
-        if channel < 0 or channel > 15:
-            return
-        self.channel = channel
-
-    def write_program_change(self, program: int) -> None:
-        self.uart.write(bytearray([0xC0 | self.channel, program]))
-        self.uart.flush()
+k_midi_thru = True
+# MIDI clock: tap the tempo, hold the tap button to start or stop
+k_clock_bpm = 120
+# Device id of the SysEx backup, 0x7F messages are for every device
+k_sysex_device = 0
+# LED levels 0-255, gamma corrected
+k_led_high = 122
+k_led_low = 65
+k_led_tick_ms = 10
+# Run the display, LEDs and flash writes on the second core. Flash writes
+# stop both cores all the same, only the display work is taken off core 0
+k_dual_core = False
+# Latency tracing, all the tracing code is compiled out when 0
+_TRACE = const(0)
+# Check at startup that button handling doesn't allocate
+_ALLOC_TEST = const(0)
 
 
 class MidiProgramManager:
     def __init__(self) -> None:
-        # Try to read from file first
-        data = dict()
+        self.program = 0
+        self.bank = 0
+        self.page = 0
+        self.patch = 0
+        # The state handed to the store, only touched by whoever saves
+        self.saved = array("H", [0, 0, 0])
+
+        self.store = storage.RingStore(
+            k_file_name, "HHB", self._snapshot, quiet_ms=k_save_quiet_ms
+        )
+        data = self.store.load()
+        if data is not None:
+            self.set_program(data[0])
+            return
+
+        # Fall back to the old JSON file
         try:
-            data = json.load(open(k_file_name))
-        except:
-            pass
+            import json
 
-        self.program = data.get("program", 0)
-        self.page = data.get("page", 0)
-        self.patch = data.get("patch", 0)
+            data = json.load(open(k_legacy_file_name))
+        except:
+            return
+        self.set_program(data.get("program", 0))
+        # Move it over to the binary record
+        self.save(self.program, self.page, self.patch)
 
     def set_patch(self, patch_number: int):
         self.patch = patch_number
         self._update_program()
 
     def set_page(self, page_number: int):
-        if page_number < 0 or page_number > k_pages:
+        if page_number < 0 or page_number >= k_pages:
             print(f"Page {page_number} request is out of bound")
             return
         self.page = page_number
         self._update_program()
 
-    def save_to_file(self) -> None:
-        data = dict()
-        data["program"] = self.program
-        data["page"] = self.page
-        data["patch"] = self.patch
-        file = open(k_file_name, "w")
-        json.dump(data, file)
+    def save(self, program: int, page: int, patch: int) -> None:
+        """Schedule a save, the file is written once the state settles"""
+        saved = self.saved
+        saved[0] = program
+        saved[1] = page
+        saved[2] = patch
+        self.store.mark_dirty()
+
+    def poll(self) -> bool:
+        return self.store.poll()
+
+    def _snapshot(self):
+        return self.saved
+
+    def set_program(self, program: int):
+        """Page and patch follow from the program for the current number
+        of patch buttons, it may have been saved with another layout"""
+        program = max(min(program, k_programs - 1), 0)
+        self.page = program // k_patches
+        self.patch = program % k_patches
+        self._update_program()
 
     def _update_program(self):
-        self.program = max(min(self.page * 3 + self.patch, 127), 0)
+        self.program = max(min(self.page * k_patches + self.patch, k_programs - 1), 0)
+        self.bank = self.program >> 7
+
+
+class Peripherals:
+    """The display, the LEDs and the state file, with the tasks driving them.
+
+    The controller talks to them only through show_page(), show_name(),
+    select(), dim(), blink_send() and save(), so they can run on either
+    core (see RemotePeripherals).
+    """
+
+    def __init__(self, pm: MidiProgramManager, sched: Scheduler, tracer=None) -> None:
+        self.pm = pm
+        self.sched = sched
+        self.tracer = tracer
+        self.leds = LedEngine(p_patch_led + [p_send_led], tick_ms=k_led_tick_ms)
+        self.send_led = len(p_patch_led)
+        self.disp = tm1637.TM1637PIO(clk=Pin(p_disp_clk), dio=Pin(p_disp_dio))
+        # Fastest reliable bus if it has to be bit-banged
+        self.disp.calibrate()
+        # Everything shown goes through the slot, rate capped
+        self.slot = tm1637.FrameSlot(self.disp, k_display_fps)
+        self.page = pm.page
+        self.scrolling = False
+
+        self.t_led = sched.add("led", self.leds.tick, k_led_tick_ms, priority=1)
+        self.t_disp = sched.add("display", self.display_task, priority=1)
+        self.t_refresh = sched.add("refresh", self.refresh_task, priority=1)
+        self.t_scroll = sched.add("scroll", self.scroll_task, k_scroll_ms, priority=1)
+        self.t_store = sched.add("store", self.store_task, 100, priority=0)
 
+        self.disp.brightness(3)
+        self.disp.cache_numbers(0, k_pages - 1)
+        self.disp.number(self.page)
 
-class MidiProgramController:
-    def __init__(self) -> None:
-        # Hardware
-        self.patch_btn = [Pin(x, Pin.IN, Pin.PULL_UP) for x in p_patch_btn]
-        self.btn_page_up = Pin(p_page_up, Pin.IN, Pin.PULL_UP)
-        self.btn_page_down = Pin(p_page_down, Pin.IN, Pin.PULL_UP)
-        self.patch_led = [PWM(Pin(p, Pin.OUT)) for p in p_patch_led]
-        self.send_led = PWM(Pin(p_send_led, Pin.OUT))
-        self.disp = tm1637.TM1637(clk=Pin(p_disp_clk), dio=Pin(p_disp_dio))
-        self.midi = Midi(k_midi_uart_id)
-
-        # Internal variables
-        self.pm = MidiProgramManager()
-        self.send_timer = Timer()
-        self.disp_timer = Timer()
-        self.btn_timer = Timer()
+    def show_page(self, page: int):
+        self.page = page
+        self.sched.post(self.t_disp)
 
-        for led in self.patch_led:
-            led.freq(1000)
-            led.duty_u16(0)
-        self.send_led.duty_u16(0)
+    def show_name(self, name):
+        """Show a preset name, given as its raw NAME_LEN bytes"""
+        name = decode_name(name)
+        if not name:
+            return
+        try:
+            if len(name) <= 4:
+                self.slot.show(name)
+                self.scrolling = False
+                self.sched.post(self.t_refresh)
+            else:
+                self.slot.scroll_start(name)
+                self.scrolling = True
+        except ValueError:
+            # Characters the display can't show
+            self.sched.post(self.t_disp)
+
+    def select(self, patch: int):
+        """Light the LED of the selected patch, if it has one"""
+        for i in range(len(p_patch_led)):
+            self.leds.set(i, 0)
+            self.leds.dim(i)
+        if patch < len(p_patch_led):
+            self.leds.set(patch, k_led_high)
+
+    def dim(self, patch: int):
+        """Dim the patch LED a bit while the page is changing"""
+        if patch < len(p_patch_led):
+            self.leds.dim(patch, k_led_low * 255 // k_led_high)
+
+    def blink_send(self):
+        self.leds.blink(self.send_led, k_led_low, 50)
+
+    def save(self, program: int, page: int, patch: int):
+        self.pm.save(program, page, patch)
+
+    def display_task(self):
+        self.scrolling = False
+        cache = self.disp.number_cache
+        self.slot.set(cache.frames, cache.offset(self.page))
+        self.sched.post(self.t_refresh)
+
+    def scroll_task(self):
+        if not self.scrolling:
+            return
+        if self.slot.scroll_step():
+            self.sched.post(self.t_refresh)
+        else:
+            # Back to the page number once the name has gone by
+            self.sched.post(self.t_disp)
+
+    def refresh_task(self):
+        wait = self.slot.refresh()
+        if wait:
+            self.sched.post_in(self.t_refresh, wait)
+        elif _TRACE and self.tracer is not None:
+            self.tracer.mark(latency.DISPLAY)
+
+    def store_task(self):
+        saved = self.pm.poll()
+        if _TRACE and saved and self.tracer is not None:
+            self.tracer.mark(latency.SAVED)
+
+
+# LED command records
+_SELECT = const(1)  # patch
+_DIM = const(2)  # patch
+_BLINK_SEND = const(3)
+# Sequence numbers wrap before they would stop being small ints
+_SEQ_MASK = const(0x3FFFFFFF)
+
+
+class RemotePeripherals:
+    """Peripherals running on the second core.
+
+    Same interface as Peripherals, but every call only queues a command on
+    a lock-free single-producer/single-consumer queue (names, LEDs). The
+    page and the state to save are latest-value-wins slots instead, so a
+    burst of changes can't fill a queue and the newest one always gets
+    through. The three values of a save are guarded by a sequence number,
+    odd while core 0 writes them. A thread started with _thread, which
+    MicroPython runs on core 1, owns the real Peripherals with its own
+    scheduler and executes the commands, so the display bus never holds up
+    MIDI and input on core 0.
+
+    Flash writes still do: the rp2 port stops the other core and disables
+    interrupts for every erase and program, so core 0 halts too. Only the
+    bytes already in the UART hardware FIFO keep going out meanwhile. The
+    write-behind store keeps those stalls rare.
+    """
+
+    def __init__(self, pm: MidiProgramManager, tracer=None) -> None:
+        import _thread
+
+        self.pm = pm
+        self.tracer = tracer
+        self.page = pm.page
+        self.page_seq = 0  # bumped by core 0 on every page change
+        self._page_seen = 0
+        self.names = SpscQueue(4, NAME_LEN)
+        self.led_cmds = SpscQueue(8, 2)
+        self.saved = array("H", [0, 0, 0])  # program, page, patch
+        self.save_seq = 0  # bumped before and after writing saved
+        self._save_seen = 0
+        self.local = None  # the Peripherals, once core 1 is up
+        self.running = True
+        self.stopped = False
+        _thread.start_new_thread(self._run, ())
+
+    def show_page(self, page: int):
+        self.page = page
+        self.page_seq = (self.page_seq + 1) & _SEQ_MASK
+
+    def show_name(self, name):
+        row = self.names.reserve()
+        if row is None:
+            return
+        row[:] = name[:NAME_LEN]
+        self.names.commit()
+
+    def select(self, patch: int):
+        self.led_cmds.put(_SELECT, patch)
+
+    def dim(self, patch: int):
+        self.led_cmds.put(_DIM, patch)
+
+    def blink_send(self):
+        self.led_cmds.put(_BLINK_SEND)
+
+    def save(self, program: int, page: int, patch: int):
+        saved = self.saved
+        self.save_seq = (self.save_seq + 1) & _SEQ_MASK
+        saved[0] = program
+        saved[1] = page
+        saved[2] = patch
+        self.save_seq = (self.save_seq + 1) & _SEQ_MASK
+
+    def stop(self):
+        """Ask core 1 to stop, stopped is set once it has"""
+        self.running = False
+
+    def _run(self):
+        # Core 1
+        local = Peripherals(self.pm, Scheduler(0), self.tracer)
+        self.local = local
+        while self.running:
+            self._execute(local)
+            if not local.sched.run_once():
+                sleep_ms(1)
+        self.stopped = True
+
+    def _execute(self, local: Peripherals):
+        seq = self.page_seq
+        if seq != self._page_seen:
+            self._page_seen = seq
+            local.show_page(self.page)
+
+        queue = self.names
+        row = queue.peek()
+        while row is not None:
+            local.show_name(row)
+            queue.pop()
+            row = queue.peek()
+
+        queue = self.led_cmds
+        row = queue.peek()
+        while row is not None:
+            if row[0] == _SELECT:
+                local.select(row[1])
+            elif row[0] == _DIM:
+                local.dim(row[1])
+            else:
+                local.blink_send()
+            queue.pop()
+            row = queue.peek()
+
+        seq = self.save_seq
+        if seq != self._save_seen and not seq & 1:
+            saved = self.saved
+            program = saved[0]
+            page = saved[1]
+            patch = saved[2]
+            if self.save_seq == seq:
+                # Not torn by a save in the meantime, else the next pass
+                self._save_seen = seq
+                local.save(program, page, patch)
 
-        self.disp.brightness(3)
-        self.disp.number(self.pm.page)
-
-        # Link patch button callbacks
-        self.patch_btn[0].irq(handler=lambda p: self.patch_callback(0))
-        self.patch_btn[1].irq(handler=lambda p: self.patch_callback(1))
-        self.patch_btn[2].irq(handler=lambda p: self.patch_callback(2))
-
-        # Link page button callbacks
-        self.btn_page_up.irq(
-            trigger=Pin.IRQ_FALLING,
-            handler=lambda p: self.btn_timer.init(
-                mode=Timer.ONE_SHOT, period=25, callback=self.page_callback
-            ),
-        )
-        self.btn_page_down.irq(
-            trigger=Pin.IRQ_FALLING,
-            handler=lambda p: self.btn_timer.init(
-                mode=Timer.ONE_SHOT, period=25, callback=self.page_callback
-            ),
-        )
 
-        self.set_patch(self.pm.patch)
+class MidiProgramController:
+    def __init__(self) -> None:
+        # Room for a traceback if an IRQ handler fails
+        micropython.alloc_emergency_exception_buf(100)
 
-    def set_patch(self, patch: int):
-        self.pm.set_patch(patch)
-        self.midi.write_program_change(self.pm.program)
-        self.pm.save_to_file()
-
-        # Blink the send LED once
-        self.send_led.duty_u16(pwm_duty(k_led_low_brightness))
-        self.send_timer.init(
-            mode=Timer.ONE_SHOT, period=50, callback=lambda t: self.send_led.duty_u16(0)
+        # Stage 1: restore the saved program and send it before touching
+        # any other hardware, the amp has to be right at power-up
+        self.pm = MidiProgramManager()
+        self.presets = PresetStore(k_presets_file_name, k_programs, k_patches)
+        self.midi = Midi(k_midi_uart_id, k_midi_channel, thru=k_midi_thru)
+        # Bound once, taking a bound method allocates
+        self._write_message = self.midi.write_message
+        if _TRACE:
+            self.tracer = latency.Tracer()
+        self.send_program()
+
+        # Stage 2 runs from the scheduler once the bytes are on the wire
+        self.sched = Scheduler()
+        self.backup = SysexBackup(
+            self.midi, self.presets, self.state, self.restore, k_sysex_device
         )
-
-        self.set_patch_led(k_led_high_brightness)
-
-    def patch_callback(self, idx: int):
-        if self.patch_btn[idx].value() is 0:
-            self.btn_timer.init(
-                mode=Timer.ONE_SHOT, period=25, callback=lambda t: self.set_patch(idx)
+        self.t_midi = self.sched.add("midi", self.midi_task, 1, priority=3)
+        self.sched.post(self.sched.add("start", self.start, priority=3))
+
+    def start(self):
+        """Bring up the inputs and the peripherals and the tasks using them"""
+        pins = [p_page_up, p_page_down, p_tap_btn]
+        if p_matrix_rows:
+            self.buttons = KeyMatrix(
+                p_matrix_rows,
+                p_matrix_cols,
+                pins,
+                self.button_event,
+                k_debounce_samples,
+                k_scan_period_ms,
+                diodes=k_matrix_diodes,
             )
         else:
-            self.btn_timer.deinit()
-
-    def page_callback(self, p: Pin):
-        if self.btn_page_up.value() is 0:
-            self.pm.set_page(self.pm.page + 1)
-        elif self.btn_page_down.value() is 0:
-            self.pm.set_page(self.pm.page - 1)
+            self.buttons = ButtonScanner(
+                p_patch_btn + pins,
+                self.button_event,
+                k_debounce_samples,
+                k_scan_period_ms,
+            )
+        # The patch buttons come first
+        self.page_up_idx = self.buttons.keys or len(p_patch_btn)
+        self.page_down_idx = self.page_up_idx + 1
+        self.tap_idx = self.page_down_idx + 1
+        for idx in (self.page_up_idx, self.page_down_idx):
+            self.buttons.repeat(
+                idx,
+                k_page_repeat_delay_ms,
+                k_page_repeat_ms,
+                k_page_repeat_min_ms,
+                k_page_repeat_accel,
+            )
+        self.clock = MidiClock(self.midi, k_clock_bpm)
+        tracer = self.tracer if _TRACE else None
+        if k_dual_core:
+            self.io = RemotePeripherals(self.pm, tracer)
         else:
-            return
+            self.io = Peripherals(self.pm, self.sched, tracer)
 
-        # Trigger a patch set after a delay
-        self.send_timer.init(
-            mode=Timer.ONE_SHOT,
-            period=250,
-            callback=lambda t: self.set_patch(self.pm.patch),
+        self.t_input = self.sched.add(
+            "input", self.buttons.scan, k_scan_period_ms, priority=2
         )
+        self.t_send = self.sched.add("send", self.send_task, priority=2)
+
+        if _TRACE:
+            # Timestamp the raw button edges, dump with 't' on the REPL
+            for pin in self.buttons.pins:
+                pin.irq(trigger=Pin.IRQ_FALLING, handler=self.tracer.begin, hard=True)
+            self.console = select.poll()
+            self.console.register(sys.stdin, select.POLLIN)
+            self.sched.add("console", self.console_task, 100, priority=0)
+
+        self.show_name(self.pm.program)
+        self.io.select(self.pm.patch)
+
+    def send_program(self):
+        """Queue the program change and the extra messages of its preset"""
+        program = self.pm.program
+        channel = self.presets.channel(program)
+        self.midi.write_program_change(program & 0x7F, channel, self.pm.bank)
+        if _TRACE:
+            self.tracer.mark(latency.QUEUED)
+        self.presets.write_messages(program, self._write_message)
+
+    def set_patch(self, patch: int):
+        pm = self.pm
+        pm.set_patch(patch)
+        self.send_program()
+        self.io.save(pm.program, pm.page, pm.patch)
+        self.show_name(pm.program)
+        self.io.blink_send()
+        self.io.select(pm.patch)
+
+    def state(self):
+        pm = self.pm
+        return pm.program, pm.page, pm.patch
+
+    def restore(self, program: int, page: int, patch: int):
+        """Go to the state of a SysEx backup. Its page and patch are those
+        of the board that sent it, ours follow from the program."""
+        if not 0 <= program < k_programs:
+            print(f"Program {program} of the backup is out of bound")
+            return
+        pm = self.pm
+        pm.set_program(program)
+        self.io.show_page(pm.page)
+        self.set_patch(pm.patch)
+
+    def button_event(self, idx: int, event: int):
+        if idx < self.page_up_idx:
+            if event == PRESS and idx < k_patches:
+                if _TRACE:
+                    self.tracer.mark(latency.PRESS)
+                self.set_patch(idx)
+            return
+        if idx == self.tap_idx:
+            if event == PRESS:
+                self.clock.tap()
+            elif event == HOLD:
+                self.clock.toggle()
+            return
 
-        # Dim the LEDs a bit while the page is changing
-        self.set_patch_led(k_led_low_brightness)
-        self.disp.number(self.pm.page)
+        if event == RELEASE:
+            # Only the page the buttons settle on is sent and saved
+            self.sched.post_in(self.t_send, k_page_settle_ms)
+            return
+        if event != PRESS and event != REPEAT:
+            return
+        if _TRACE and event == PRESS:
+            self.tracer.mark(latency.PRESS)
+        self.sched.cancel(self.t_send)
+        page = self.pm.page + (1 if idx == self.page_up_idx else -1)
+        if not 0 <= page < k_pages:
+            return
+        self.pm.set_page(page)
+        self.io.dim(self.pm.patch)
+        self.io.show_page(page)
 
-    def set_patch_led(self, brightness: float):
-        for led in self.patch_led:
-            led.duty_u16(0)
-        self.patch_led[self.pm.patch].duty_u16(pwm_duty(brightness))
+    def send_task(self):
+        self.set_patch(self.pm.patch)
 
+    def midi_task(self):
+        self.midi.service()
+        if self.backup.dumping():
+            self.backup.service()
+        if _TRACE and not self.midi.depth():
+            self.tracer.mark(latency.SENT, latency.QUEUED)
 
-midi_pc = MidiProgramController()
+    def show_name(self, program: int):
+        if self.presets.has_name(program):
+            self.io.show_name(self.presets.record(program))
 
-while 1:
-    pass
+    def console_task(self):
+        if not self.console.poll(0):
+            return
+        cmd = sys.stdin.read(1)
+        if cmd == "t":
+            self.tracer.report()
+        elif cmd == "d":
+            self.tracer.dump()
+        elif cmd == "s":
+            self.sched.report()
+        elif cmd == "c":
+            clock = self.clock
+            print(
+                f"clock {clock.bpm()} bpm, {clock.ticks} ticks,"
+                f" late max {clock.late_max} us, total {clock.late_total} us"
+            )
+
+    def check_allocations(self, presses: int = 1000):
+        """Simulate button presses and assert the heap didn't grow.
+
+        The scheduler tasks they trigger run as well. Patch presses are
+        interleaved with page up and down so the page stays in range. A
+        displayed preset name is the one path allowed to allocate, so run
+        this with names that fit the display or none at all.
+
+        Runs the scheduler until the boot is complete first, the buttons
+        only exist once start() has run."""
+        while self.sched.run_once():
+            pass
+        sequence = (0, self.page_up_idx, k_patches - 1, self.page_down_idx)
+        gc.collect()
+        gc.disable()
+        before = gc.mem_alloc()
+        for i in range(presses):
+            idx = sequence[i % len(sequence)]
+            self.button_event(idx, PRESS)
+            self.button_event(idx, RELEASE)
+            while self.sched.run_once():
+                pass
+        allocated = gc.mem_alloc() - before
+        gc.enable()
+        print(f"{presses} presses allocated {allocated} bytes")
+        assert allocated == 0, "button handling allocates"
+
+
+if __name__ == "__main__":
+    midi_pc = MidiProgramController()
+    if _ALLOC_TEST:
+        midi_pc.check_allocations()
+    midi_pc.sched.run()
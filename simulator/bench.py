@@ -0,0 +1,476 @@
+"""Performance scenarios for the MIDI program controller on the simulator.
+
+    python3 simulator/bench.py [--bitbang] [--dual-core] [--matrix] [scenario ...]
+
+Every scenario boots a fresh controller in an empty directory, plays a
+button sequence on the virtual clock and reports display bus work, UART
+traffic and button-to-program-change latency, flash writes and the peak
+Python memory allocated while it ran.
+
+Clock scenarios measure the jitter of the MIDI clock bytes: how late each
+0xF8 finishes on the wire compared to the ideal tick grid of the tempo.
+
+Boot is measured from power-on to the first MIDI byte, on the virtual clock
+(time the code slept or waited for hardware) and in host CPU time (Python
+work done first, only comparable between runs on the same machine).
+"""
+
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import sim
+
+sim.install()
+
+import machine  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+CONTROLLER = os.path.join(ROOT, "midi_program_controller")
+LIB = os.path.join(ROOT, "lib")
+
+
+class Run:
+    """One controller instance on a fresh virtual clock"""
+
+    def __init__(self, controller, setup=None) -> None:
+        sim.reset()
+        machine.Pin.external[controller.p_disp_dio] = _display_ack(controller.p_disp_clk)
+        os.chdir(tempfile.mkdtemp(prefix="bench-"))
+        if setup is not None:
+            setup()
+        self.controller = controller
+        self.presses = []
+        self.releases = []
+        self.display_writes = 0
+        self.display_us = 0
+        self.first_byte_host = None
+        Run.current = self
+
+        tracemalloc.start()
+        self.base = {}
+        self.mark()
+        self.power_on_host = time.perf_counter()
+        self.ctrl = controller.MidiProgramController()
+
+    def counters(self) -> dict:
+        ctrl = getattr(self, "ctrl", None)
+        io = getattr(ctrl, "io", None)  # up once boot is done
+        disp = getattr(getattr(io, "local", io), "disp", None)
+        display_pins = (self.controller.p_disp_clk, self.controller.p_disp_dio)
+        uart = machine.UART.instances.get(self.controller.k_midi_uart_id)
+        return {
+            "disp writes": self.display_writes,
+            "disp us": self.display_us,
+            "edges": machine.Pin.edge_count(display_pins),
+            "pio words": sum(len(sm.words) for sm in _state_machines()),
+            "disp bytes": disp.bytes_sent if disp else 0,
+            "uart bytes": len(uart.tx) if uart else 0,
+            "flash writes": ctrl.pm.store.writes if ctrl else 0,
+        }
+
+    def mark(self) -> None:
+        """Start measuring from here, boot work is left out"""
+        self.base = self.counters()
+        self.marked = sim.clock.now_us
+        tracemalloc.reset_peak()
+        self.alloc_base = tracemalloc.get_traced_memory()[0] - _sim_bytes()
+
+    def run_for(self, ms: int) -> None:
+        end = sim.clock.now_us + ms * 1000
+        while sim.clock.now_us < end:
+            if not self.ctrl.sched.run_once():
+                machine.idle()
+
+    def run_until_sent(self, limit_ms: int = 1000) -> None:
+        uart = self.uart()
+        end = sim.clock.now_us + limit_ms * 1000
+        while not uart.tx and sim.clock.now_us < end:
+            if not self.ctrl.sched.run_once():
+                machine.idle()
+
+    def press(self, button, hold_ms: int = 30, gap_ms: int = 30) -> None:
+        """Press a button, a GPIO number or a matrix key as (row, column)"""
+        self.presses.append(sim.clock.now_us)
+        _button(button, True)
+        self.run_for(hold_ms)
+        self.releases.append(sim.clock.now_us)
+        _button(button, False)
+        self.run_for(gap_ms)
+
+    def uart(self):
+        return machine.UART.instances[self.controller.k_midi_uart_id]
+
+    def program_changes(self):
+        """Completion times of the program change messages on the wire"""
+        times = []
+        status = 0
+        for t, b in self.uart().tx:
+            if b & 0x80:
+                if b < 0xF8:
+                    status = b
+                continue
+            if status & 0xF0 == 0xC0:
+                times.append(t)
+        return times
+
+    def latencies(self, starts):
+        sent = self.program_changes()
+        result = []
+        for start in starts:
+            after = [t for t in sent if t >= start]
+            if after:
+                result.append(after[0] - start)
+        return result
+
+    def first_byte_us(self) -> int:
+        """Virtual time from power-on to the start of the first MIDI byte"""
+        uart = self.uart()
+        return uart.tx[0][0] - uart.byte_us if uart.tx else -1
+
+    def report(self, name: str, latencies) -> dict:
+        _, peak = tracemalloc.get_traced_memory()
+        alloc = peak - _sim_bytes() - self.alloc_base
+        tracemalloc.stop()
+        now = self.counters()
+        jitter = self.clock_jitter()
+        io = getattr(self.ctrl, "io", None)
+        if hasattr(io, "stop"):
+            # Keep the clock going until the second core is done
+            io.stop()
+            while not io.stopped:
+                machine.idle()
+        delta = {key: now[key] - self.base[key] for key in now}
+        writes = max(delta["disp writes"], 1)
+        return {
+            "scenario": name,
+            "disp writes": delta["disp writes"],
+            "us/write": delta["disp us"] // writes,
+            "edges/write": delta["edges"] // writes,
+            "words/write": delta["pio words"] // writes,
+            "bytes/write": delta["disp bytes"] / writes,
+            "uart bytes": delta["uart bytes"],
+            "uart busy %": delta["uart bytes"] * self.uart().byte_us * 100 / max(sim.clock.now_us - self.marked, 1),
+            "lat avg ms": sum(latencies) / len(latencies) / 1000 if latencies else 0,
+            "lat max ms": max(latencies) / 1000 if latencies else 0,
+            "flash writes": delta["flash writes"],
+            "alloc kB": max(alloc, 0) / 1024,
+            "1st byte us": self.first_byte_us(),
+            "1st byte host ms": (self.first_byte_host - self.power_on_host) * 1000 if self.first_byte_host else -1.0,
+            "clk jit avg us": sum(jitter) / len(jitter) if jitter else 0.0,
+            "clk jit max us": max(jitter) if jitter else 0,
+        }
+
+    def clock_jitter(self):
+        """Lateness of every clock byte against the ideal grid, which starts
+        at the first one"""
+        clock = getattr(self.ctrl, "clock", None)
+        if clock is None:
+            return []
+        ticks = [t for t, b in self.uart().tx if b == 0xF8]
+        if not ticks:
+            return []
+        beat = clock.beat_us
+        return [t - ticks[0] - k * beat // 24 for k, t in enumerate(ticks)]
+
+
+# Shortest CLK high or low time the simulated display keeps up with
+DISPLAY_MIN_US = 2
+
+
+def _display_ack(clk: int):
+    """ACK level of the simulated display: it pulls DIO low after a byte
+    whose 8 CLK pulses all lasted DISPLAY_MIN_US or more per half period"""
+
+    def ack() -> int:
+        times = [t for t, _ in machine.Pin.edges.get(clk, [])[-16:]]
+        ok = len(times) == 16 and all(b - a >= DISPLAY_MIN_US for a, b in zip(times, times[1:]))
+        return 0 if ok else 1
+
+    return ack
+
+
+def _state_machines():
+    rp2 = sys.modules.get("rp2")
+    return rp2.StateMachine.instances.values() if rp2 is not None else ()
+
+
+def _sim_bytes() -> int:
+    """Memory held by the simulator logs, not by the code under test"""
+    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(True, os.path.join(HERE, "*"))])
+    return sum(stat.size for stat in snapshot.statistics("filename"))
+
+
+def _count_display_writes(tm1637) -> None:
+    write = tm1637.TM1637.write
+
+    def counted(self, *args, **kwargs):
+        run = Run.current
+        start = sim.clock.now_us
+        write(self, *args, **kwargs)
+        run.display_writes += 1
+        if threading.current_thread() is threading.main_thread():
+            # On the second core the clock also moves while it waits
+            run.display_us += sim.clock.now_us - start
+
+    tm1637.TM1637.write = counted
+
+
+def _time_first_byte() -> None:
+    write = machine.UART.write
+
+    def timed(self, buf):
+        run = Run.current
+        if run.first_byte_host is None:
+            run.first_byte_host = time.perf_counter()
+        return write(self, buf)
+
+    machine.UART.write = timed
+
+
+def _button(button, down: bool) -> None:
+    if isinstance(button, tuple):
+        (machine.Pin.close if down else machine.Pin.open)(*button)
+    else:
+        machine.Pin(button).drive(0 if down else 1)
+
+
+def _patch_buttons(controller):
+    """The patch buttons, matrix keys row by row when there is a matrix"""
+    if controller.p_matrix_rows:
+        keys = [(row, col) for row in controller.p_matrix_rows for col in controller.p_matrix_cols]
+        return keys[: controller.k_patches]
+    return controller.p_patch_btn
+
+
+def _save_state(controller, page: int, patch: int) -> None:
+    program = page * controller.k_patches + patch
+    store = controller.storage.RingStore(controller.k_file_name, "HHB", lambda: (program, page, patch))
+    store.mark_dirty()
+    store.flush()
+
+
+def boot(controller) -> dict:
+    """Power-on with a program in bank 1 saved, until the boot is complete"""
+    run = Run(controller, lambda: _save_state(controller, 50, 1))
+    run.run_until_sent()
+    run.run_for(100)
+    return run.report("boot", run.latencies([0]))
+
+
+def page_scroll(controller) -> dict:
+    """20 quick page-up presses, only the final page should be sent"""
+    run = Run(controller)
+    run.run_for(500)
+    run.mark()
+    for _ in range(20):
+        run.press(controller.p_page_up)
+    run.run_for(1000)
+    return run.report("page scroll", run.latencies(run.releases[-1:]))
+
+
+def page_hold(controller) -> dict:
+    """Hold page up from page 0 until page 127 (or the last one), then let
+    go"""
+    run = Run(controller)
+    run.run_for(500)
+    run.mark()
+    pin = machine.Pin(controller.p_page_up)
+    start = sim.clock.now_us
+    pin.drive(0)
+    while run.ctrl.pm.page < min(127, controller.k_pages - 1):
+        run.run_for(1)
+    pin.drive(1)
+    run.releases.append(sim.clock.now_us)
+    run.run_for(1000)
+    return run.report("page hold", run.latencies([start]))
+
+
+def patch_burst(controller) -> dict:
+    """1000 patch presses cycling over the patch buttons"""
+    run = Run(controller)
+    run.run_for(500)
+    run.mark()
+    buttons = _patch_buttons(controller)
+    for i in range(1000):
+        run.press(buttons[i % len(buttons)])
+    run.run_for(5000)
+    pm = run.ctrl.pm
+    if list(pm.saved) != [pm.program, pm.page, pm.patch]:
+        raise AssertionError(f"saved {list(pm.saved)} after the last press")
+    return run.report("patch burst", run.latencies(run.presses))
+
+
+def _clock(controller, name: str, reserve: bool = True) -> dict:
+    """Tap 7 times 700 ms apart (85.7 bpm, ticks every 29166.7 us), hold
+    to start the clock, then scroll across a bank change and play patches
+    for 10 s, with a note coming in on MIDI thru every 7 ms"""
+    run = Run(controller, lambda: _save_state(controller, 38, 0))
+    run.run_for(500)
+    run.mark()
+    notes = machine.Timer()
+    notes.init(period=7, callback=lambda t: run.uart().inject(b"\x90\x3c\x40"))
+    if not reserve:
+        # Clock bytes wait behind whatever batch is on the wire
+        run.ctrl.midi.reserve = lambda due: None
+    for _ in range(7):
+        run.press(controller.p_tap_btn, gap_ms=670)
+    run.press(controller.p_tap_btn, hold_ms=600)
+    buttons = _patch_buttons(controller)
+    for i in range(50):
+        run.press(controller.p_page_up if i % 10 < 5 else buttons[i % len(buttons)], gap_ms=170)
+    run.run_for(500)
+    run.ctrl.clock.stop()
+    notes.deinit()
+    return run.report(name, run.latencies(run.presses[8:]))
+
+
+def _presets(controller, count: int = 128) -> None:
+    presets = controller.PresetStore(controller.k_presets_file_name, controller.k_programs)
+    for program in range(count):
+        presets.set(program, f"PRESET {program}", program % 16, [(0xB0, 7, program)])
+
+
+_DUMP_REQUEST = bytes((0xF0, 0x7D, 0x00, 0x01, 0xF7))
+
+
+def _dump(run) -> bytes:
+    """Request a dump and return it once it is all on the wire"""
+    uart = run.uart()
+    sent = len(uart.tx)
+    uart.inject(_DUMP_REQUEST)
+    run.run_for(1)
+    while run.ctrl.backup.dumping() or run.ctrl.midi.depth() or not uart.txdone():
+        if not run.ctrl.sched.run_once():
+            machine.idle()
+    # No slice of the log, its copy would count as allocated by the code
+    return bytes(uart.tx[i][1] for i in range(sent, len(uart.tx)))
+
+
+def backup(controller) -> dict:
+    """SysEx dump of 128 presets and the state"""
+    run = Run(controller, lambda: (_presets(controller), _save_state(controller, 5, 2)))
+    run.run_for(500)
+    run.mark()
+    _dump(run)
+    return run.report("backup", [])
+
+
+def _foreign_state(controller, dump: bytes) -> bytes:
+    """The dump with the STATE chunk a board with another number of patch
+    buttons sends for the same program"""
+    import sysex
+
+    program = 5 * controller.k_patches + 2
+    patches = 3 if controller.k_patches != 3 else 16
+    raw = struct.pack("<HHB", program, program // patches, program % patches)
+    body = bytearray(2 + sysex.packed_size(len(raw)))
+    sysex.pack7(raw, len(raw), body, 2)
+    header = bytes((0xF0, sysex.MANUFACTURER, controller.k_sysex_device, sysex.STATE))
+    start = dump.index(header)
+    end = dump.index(0xF7, start) + 1
+    return dump[:start] + header + body + bytes((-sum(body) & 0x7F, 0xF7)) + dump[end:]
+
+
+def restore(controller) -> dict:
+    """Receive the dump of the backup scenario at wire speed into a fresh
+    controller, with the page and patch of another button layout"""
+    run = Run(controller, lambda: (_presets(controller), _save_state(controller, 5, 2)))
+    run.run_for(500)
+    dump = _foreign_state(controller, _dump(run))
+    run.report("dump", [])
+
+    run = Run(controller)
+    run.run_for(500)
+    run.mark()
+    uart = run.uart()
+    pos = 0
+
+    def receive(t):
+        nonlocal pos
+        if pos < len(dump):
+            uart.inject(dump[pos : pos + 1])
+            pos += 1
+
+    wire = machine.Timer()
+    wire.init(period=uart.byte_us, tick_hz=1_000_000, callback=receive)
+    while pos < len(dump):
+        run.run_for(10)
+    run.run_for(100)
+    wire.deinit()
+    ctrl = run.ctrl
+    if ctrl.backup.restored != 1 or ctrl.pm.page != 5 or ctrl.pm.patch != 2:
+        raise AssertionError("restore failed")
+    for program in range(128):
+        if ctrl.presets.name(program) != f"PRESET {program}"[: controller.NAME_LEN]:
+            raise AssertionError(f"preset {program} not restored")
+    return run.report("restore", [])
+
+
+def clock(controller) -> dict:
+    return _clock(controller, "clock")
+
+
+def clock_unreserved(controller) -> dict:
+    """The same without holding program changes back for the clock"""
+    return _clock(controller, "clock unreserved", reserve=False)
+
+
+SCENARIOS = {
+    "boot": boot,
+    "page_scroll": page_scroll,
+    "page_hold": page_hold,
+    "patch_burst": patch_burst,
+    "clock": clock,
+    "clock_unreserved": clock_unreserved,
+    "backup": backup,
+    "restore": restore,
+}
+
+
+def print_table(rows) -> None:
+    columns = list(rows[0])
+    cells = [
+        [c if isinstance(c, str) else f"{c:.2f}" if isinstance(c, float) else str(c) for c in row.values()]
+        for row in rows
+    ]
+    widths = [max(len(col), *(len(r[i]) for r in cells)) for i, col in enumerate(columns)]
+    print("  ".join(col.rjust(w) for col, w in zip(columns, widths)))
+    for r in cells:
+        print("  ".join(c.rjust(w) for c, w in zip(r, widths)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bitbang", action="store_true", help="run the display without PIO")
+    parser.add_argument("--dual-core", action="store_true", help="run the peripherals on a second thread")
+    parser.add_argument("--matrix", action="store_true", help="16 patch buttons on a 4x4 key matrix")
+    parser.add_argument("scenarios", nargs="*", choices=[[]] + list(SCENARIOS), default=[])
+    args = parser.parse_args()
+
+    if args.bitbang:
+        sys.modules["rp2"] = None
+    sys.path[1:1] = [CONTROLLER, LIB]
+    import main as controller
+
+    controller.k_dual_core = args.dual_core
+    if args.matrix:
+        controller.p_matrix_rows = [2, 3, 4, 5]
+        controller.p_matrix_cols = [12, 13, 14, 15]
+        controller.k_patches = 16
+        controller.k_pages = (controller.k_programs + 15) // 16
+    _count_display_writes(controller.tm1637)
+    _time_first_byte()
+
+    names = args.scenarios or list(SCENARIOS)
+    print_table([SCENARIOS[name](controller) for name in names])
+
+
+if __name__ == "__main__":
+    main()
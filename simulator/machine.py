@@ -0,0 +1,320 @@
+"""Simulated machine module: pins, timers, PWM and UART on the virtual clock."""
+
+from array import array
+
+from sim import clock
+
+_SIO_GPIO_IN = 0xD0000004
+_SIO_GPIO_OUT = 0xD0000010
+_SIO_GPIO_OUT_SET = 0xD0000014
+_SIO_GPIO_OUT_CLR = 0xD0000018
+_SIO_GPIO_OUT_XOR = 0xD000001C
+_SIO_GPIO_OE_SET = 0xD0000024
+_SIO_GPIO_OE_CLR = 0xD0000028
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    ALT = 3
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    # Shared state per GPIO number, any Pin object for a number sees it
+    levels = {}
+    modes = {}
+    # Level other chips hold a GPIO at while it is an input, or a function
+    # returning it, called when the pin becomes an input
+    external = {}
+    handlers = {}
+    edges = {}  # GPIO number -> [(time us, level)]
+    switches = set()  # closed switches, each a frozenset of two GPIO numbers
+
+    def __init__(self, id, mode=-1, pull=-1, value=None) -> None:
+        self.id = id
+        Pin.levels.setdefault(id, 0)
+        Pin.edges.setdefault(id, [])
+        self.init(mode, pull, value)
+
+    def init(self, mode=-1, pull=-1, value=None) -> None:
+        if mode != -1:
+            Pin.modes[self.id] = mode
+            if mode == Pin.IN and self.id in Pin.external:
+                level = Pin.external[self.id]
+                self._set(level() if callable(level) else level)
+                return
+        if pull == Pin.PULL_UP and value is None:
+            # Nothing pressed
+            Pin.levels[self.id] = 1
+        if value is not None:
+            self._set(value)
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def value(self, value=None):
+        if value is None:
+            return _level(self.id)
+        self._set(value)
+
+    def on(self) -> None:
+        self._set(1)
+
+    def off(self) -> None:
+        self._set(0)
+
+    def low(self) -> None:
+        self._set(0)
+
+    def high(self) -> None:
+        self._set(1)
+
+    def toggle(self) -> None:
+        self._set(not Pin.levels[self.id])
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False) -> None:
+        Pin.handlers[self.id] = (handler, trigger)
+
+    def drive(self, value) -> None:
+        """Drive the pin from outside (a button, another chip)"""
+        self._set(value)
+
+    def _set(self, value) -> None:
+        value = 1 if value else 0
+        old = Pin.levels[self.id]
+        if value == old:
+            return
+        Pin.levels[self.id] = value
+        Pin.edges[self.id].append((clock.now_us, value))
+        handler, trigger = Pin.handlers.get(self.id, (None, 0))
+        if handler is not None and trigger & (Pin.IRQ_RISING if value else Pin.IRQ_FALLING):
+            handler(self)
+
+    @staticmethod
+    def edge_count(ids) -> int:
+        return sum(len(Pin.edges.get(i, ())) for i in ids)
+
+    @staticmethod
+    def close(a: int, b: int) -> None:
+        """Close a switch between two GPIOs, a key of a matrix"""
+        Pin.switches.add(frozenset((a, b)))
+
+    @staticmethod
+    def open(a: int, b: int) -> None:
+        Pin.switches.discard(frozenset((a, b)))
+
+
+def _level(gpio: int) -> int:
+    """Level read on a GPIO. An input connected through closed switches,
+    even several in a row, follows the output at the other end."""
+    if not Pin.switches or Pin.modes.get(gpio) == Pin.OUT:
+        return Pin.levels[gpio]
+    seen = {gpio}
+    todo = [gpio]
+    while todo:
+        node = todo.pop()
+        for switch in Pin.switches:
+            if node not in switch:
+                continue
+            (other,) = switch - {node}
+            if other in seen:
+                continue
+            if Pin.modes.get(other) == Pin.OUT:
+                return Pin.levels.get(other, 0)
+            seen.add(other)
+            todo.append(other)
+    return Pin.levels[gpio]
+
+
+class _Mem32:
+    """SIO GPIO registers, enough for port-wide reads and set/clear writes.
+
+    Setting the output enable of a pin drives it low and clearing it lets
+    it float back up, as for open-drain matrix rows latched low.
+    """
+
+    def __getitem__(self, addr: int) -> int:
+        if addr in (_SIO_GPIO_IN, _SIO_GPIO_OUT):
+            read = _level if addr == _SIO_GPIO_IN else Pin.levels.get
+            port = 0
+            for gpio in list(Pin.levels):
+                if read(gpio):
+                    port |= 1 << gpio
+            return port
+        return 0
+
+    def __setitem__(self, addr: int, value: int) -> None:
+        for gpio in range(30):
+            if not value & (1 << gpio):
+                continue
+            pin = Pin(gpio)
+            if addr == _SIO_GPIO_OUT_SET:
+                pin._set(1)
+            elif addr == _SIO_GPIO_OUT_CLR:
+                pin._set(0)
+            elif addr == _SIO_GPIO_OUT_XOR:
+                pin.toggle()
+            elif addr == _SIO_GPIO_OE_SET:
+                pin.init(Pin.OUT, value=0)
+            elif addr == _SIO_GPIO_OE_CLR:
+                pin.init(Pin.IN, value=1)
+
+
+mem32 = _Mem32()
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs) -> None:
+        self.callback = None
+        self.period_us = 0
+        self.mode = Timer.ONE_SHOT
+        self.deadline = 0
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, period=-1, freq=-1, callback=None, tick_hz=1000, hard=False) -> None:
+        self.deinit()
+        if freq > 0:
+            self.period_us = 1_000_000 // freq
+        else:
+            self.period_us = period * 1_000_000 // tick_hz
+        self.mode = mode
+        self.callback = callback
+        self.deadline = clock.now_us + max(self.period_us, 1)
+        clock.timers.append(self)
+
+    def deinit(self) -> None:
+        if self in clock.timers:
+            clock.timers.remove(self)
+
+    def fire(self) -> None:
+        if self.mode == Timer.PERIODIC:
+            self.deadline += max(self.period_us, 1)
+        else:
+            self.deinit()
+        if self.callback is not None:
+            self.callback(self)
+
+
+class PWM:
+    instances = []
+
+    def __init__(self, pin, freq=0, duty_u16=None) -> None:
+        self.pin = pin
+        self._freq = freq
+        self._duty = 0
+        # time us, duty, time us, duty... Raw values, so the log doesn't
+        # keep the int objects of the code under test alive (bench alloc)
+        self.log = array("q")
+        PWM.instances.append(self)
+        if duty_u16 is not None:
+            self.duty_u16(duty_u16)
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        self._freq = value
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self._duty
+        self._duty = value
+        self.log.append(clock.now_us)
+        self.log.append(value)
+
+    def duties(self):
+        """The log as [(time us, duty)]"""
+        return list(zip(self.log[::2], self.log[1::2]))
+
+    def deinit(self) -> None:
+        pass
+
+
+class UART:
+    instances = {}
+
+    def __init__(self, id, baudrate=9600, **kwargs) -> None:
+        self.id = id
+        self.tx = []  # [(time us the byte is fully out, byte)]
+        self.rx = bytearray()
+        self.line_free = 0
+        UART.instances[id] = self
+        self.init(baudrate)
+
+    def init(self, baudrate=9600, bits=8, parity=None, stop=1, **kwargs) -> None:
+        self.byte_us = 10 * 1_000_000 // baudrate
+
+    def write(self, buf) -> int:
+        start = max(clock.now_us, self.line_free)
+        for b in bytes(buf):
+            start += self.byte_us
+            self.tx.append((start, b))
+        self.line_free = start
+        return len(buf)
+
+    def txdone(self) -> bool:
+        return clock.now_us >= self.line_free
+
+    def flush(self) -> None:
+        clock.advance_to(self.line_free)
+
+    def any(self) -> int:
+        return len(self.rx)
+
+    def read(self, n=-1):
+        if not self.rx:
+            return None
+        n = len(self.rx) if n < 0 else min(n, len(self.rx))
+        data = bytes(self.rx[:n])
+        del self.rx[:n]
+        return data
+
+    def readinto(self, buf, n=-1):
+        data = self.read(len(buf) if n < 0 else n)
+        if data is None:
+            return None
+        buf[: len(data)] = data
+        return len(data)
+
+    def inject(self, data) -> None:
+        """Bytes arriving on RX"""
+        self.rx.extend(data)
+
+    def sent(self) -> bytes:
+        return bytes(b for _, b in self.tx)
+
+
+def idle() -> None:
+    """Sleep until the next timer interrupt"""
+    deadline = clock.next_deadline()
+    clock.advance_to(deadline if deadline is not None else clock.now_us + 1000)
+
+
+def disable_irq() -> int:
+    return 0
+
+
+def enable_irq(state: int = 0) -> None:
+    pass
+
+
+def freq() -> int:
+    return 125_000_000
+
+
+def reset() -> None:
+    """Forget every pin, PWM and UART (sim.reset)"""
+    Pin.levels.clear()
+    Pin.modes.clear()
+    Pin.external.clear()
+    Pin.handlers.clear()
+    Pin.edges.clear()
+    Pin.switches.clear()
+    PWM.instances.clear()
+    UART.instances.clear()
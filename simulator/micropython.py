@@ -0,0 +1,21 @@
+"""Simulated micropython module."""
+
+
+def const(value):
+    return value
+
+
+def native(func):
+    return func
+
+
+def viper(func):
+    return func
+
+
+def schedule(func, arg) -> None:
+    func(arg)
+
+
+def alloc_emergency_exception_buf(size: int) -> None:
+    pass
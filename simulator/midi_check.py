@@ -0,0 +1,160 @@
+"""Assertion checks of the MIDI parser and port on recorded byte streams.
+
+    python3 simulator/midi_check.py
+
+Byte streams go through MidiParser directly, or through Midi on the
+simulated UART, and the parsed messages or the bytes sent are compared with
+what they should be. Exits with an AssertionError on the first mismatch.
+"""
+
+import os
+import sys
+
+import sim
+
+sim.install()
+
+import machine  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(1, os.path.join(os.path.dirname(HERE), "lib"))
+
+from midi import Midi, MidiParser  # noqa: E402
+
+
+def parse(data, sysex=False):
+    """Messages, realtime bytes and SysEx bytes parsed from data"""
+    messages = []
+    realtime = []
+    sysex_bytes = []
+    parser = MidiParser(
+        lambda *msg: messages.append(msg),
+        realtime.append,
+        sysex_bytes.append if sysex else None,
+    )
+    for b in data:
+        parser.feed(b)
+    return messages, realtime, sysex_bytes
+
+
+def check_running_status() -> None:
+    messages, _, _ = parse(bytes.fromhex("90 3c 40 3e 41 c0 05 06 b0 07 7f"))
+    assert messages == [
+        (0x90, 0x3C, 0x40),
+        (0x90, 0x3E, 0x41),
+        (0xC0, 0x05, -1),
+        (0xC0, 0x06, -1),
+        (0xB0, 0x07, 0x7F),
+    ], messages
+
+
+def check_realtime_inside_messages() -> None:
+    messages, realtime, _ = parse(bytes.fromhex("90 f8 3c fa 40 3e f8 41"))
+    assert messages == [(0x90, 0x3C, 0x40), (0x90, 0x3E, 0x41)], messages
+    assert realtime == [0xF8, 0xFA, 0xF8], realtime
+
+
+def check_system_common() -> None:
+    # System common messages cancel running status
+    messages, _, _ = parse(bytes.fromhex("90 3c 40 f2 01 02 f6 3e 41 f3 05"))
+    assert messages == [(0x90, 0x3C, 0x40), (0xF2, 0x01, 0x02), (0xF6, -1, -1), (0xF3, 0x05, -1)], messages
+
+
+def check_sysex_skipped() -> None:
+    data = bytes.fromhex("f0 7d 01 3c 40 f7 90 3c 40 f0 7d 02 f8 03 f7 c0 05")
+    messages, realtime, _ = parse(data)
+    assert messages == [(0x90, 0x3C, 0x40), (0xC0, 0x05, -1)], messages
+    assert realtime == [0xF8], realtime
+
+    _, _, sysex = parse(data, sysex=True)
+    assert sysex == [0xF0, 0x7D, 0x01, 0x3C, 0x40, 0xF7, 0xF0, 0x7D, 0x02, 0x03, 0xF7], sysex
+
+
+def check_sysex_cut_short() -> None:
+    # A status byte ends SysEx without F7, and starts its own message
+    messages, _, sysex = parse(bytes.fromhex("f0 7d 01 90 3c 40"), sysex=True)
+    assert sysex == [0xF0, 0x7D, 0x01, -1], sysex
+    assert messages == [(0x90, 0x3C, 0x40)], messages
+
+
+def run_port(midi, steps) -> bytes:
+    """Play (bytes received, our message or None) steps through the port,
+    then drain it and return everything sent"""
+    uart = machine.UART.instances[0]
+    for received, ours in steps:
+        if received:
+            uart.inject(received)
+        if ours is not None:
+            midi.write_message(*ours)
+        midi.service()
+        sim.clock.advance(100)
+    while midi.depth():
+        sim.clock.advance(1000)
+        midi.service()
+    return uart.sent()
+
+
+def check_thru_merge() -> None:
+    """Incoming messages go out whole and in order, at message boundaries
+    of our own, realtime bytes straight away"""
+    sim.reset()
+    midi = Midi(0, thru=True)
+    sent = run_port(
+        midi,
+        [
+            (bytes.fromhex("90 3c"), (0xC0, 0x05)),  # half a note, our PC
+            (bytes.fromhex("f8"), None),  # clock inside the note
+            # The rest and a second note in running status, our CC is
+            # queued before service() reads them
+            (bytes.fromhex("40 3e 41"), (0xB0, 0x07, 0x7F)),
+            (bytes.fromhex("f0 7d 01 f7"), None),  # SysEx isn't forwarded
+        ],
+    )
+    assert sent == bytes.fromhex("c0 05 f8 b0 07 7f 90 3c 40 90 3e 41"), sent.hex(" ")
+
+
+def check_callback_writes() -> None:
+    """A receive callback that writes and calls service(), as a restore
+    does, doesn't re-enter the parser on the bytes still being walked"""
+    sim.reset()
+    midi = Midi(0, queue_size=128, thru=True)
+
+    def on_receive(status, data1, data2):
+        if data1 == 0x3C:
+            midi.write_message(0xC0, 0x05)
+            midi.service()
+
+    midi.on_receive = on_receive
+    notes = bytes(b for note in range(0x3C, 0x50) for b in (0x90, note, 0x40))
+    sent = run_port(midi, [(notes, None)])
+    assert sent == notes[:3] + bytes.fromhex("c0 05") + notes[3:], sent.hex(" ")
+
+
+def check_running_status_output() -> None:
+    sim.reset()
+    midi = Midi(0, running_status=True)
+    steps = [(None, (0x90, 0x3C, 0x40)), (None, (0x90, 0x3E, 0x41)), (None, (0xF6,)), (None, (0x90, 0x3C, 0))]
+    sent = run_port(midi, steps)
+    assert sent == bytes.fromhex("90 3c 40 3e 41 f6 90 3c 00"), sent.hex(" ")
+
+
+CHECKS = [
+    check_running_status,
+    check_realtime_inside_messages,
+    check_system_common,
+    check_sysex_skipped,
+    check_sysex_cut_short,
+    check_thru_merge,
+    check_callback_writes,
+    check_running_status_output,
+]
+
+
+def main() -> None:
+    for check in CHECKS:
+        check()
+        print(f"ok  {check.__name__}")
+
+
+if __name__ == "__main__":
+    main()
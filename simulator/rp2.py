@@ -0,0 +1,51 @@
+"""Simulated rp2 module: PIO programs are not executed, state machines only
+record the words pushed into their TX FIFO."""
+
+
+class PIO:
+    IN_LOW = 0
+    IN_HIGH = 1
+    OUT_LOW = 2
+    OUT_HIGH = 3
+    SHIFT_LEFT = 0
+    SHIFT_RIGHT = 1
+    JOIN_NONE = 0
+    JOIN_TX = 1
+    JOIN_RX = 2
+
+
+def asm_pio(**kwargs):
+    def wrap(func):
+        return func
+
+    return wrap
+
+
+class StateMachine:
+    instances = {}
+
+    def __init__(self, id, program=None, freq=-1, **kwargs) -> None:
+        self.id = id
+        self.program = program
+        self.freq = freq
+        self.words = []
+        self.running = False
+        StateMachine.instances[id] = self
+
+    def active(self, value=None):
+        if value is None:
+            return self.running
+        self.running = bool(value)
+
+    def put(self, value, shift: int = 0) -> None:
+        if isinstance(value, int):
+            self.words.append(value >> shift)
+        else:
+            self.words.extend(v >> shift for v in value)
+
+    def tx_fifo(self) -> int:
+        return 0
+
+
+def reset() -> None:
+    StateMachine.instances.clear()
@@ -0,0 +1,119 @@
+"""Virtual clock for the host simulator.
+
+Nothing in the simulated machine takes time except what the code asks for:
+sleeps, idle() and the UART line. Timers fire in deadline order as the clock
+advances, so every run of a scenario gives the same numbers.
+
+Only the main thread (core 0) moves the clock. A sleep in any other thread
+(core 1, started with _thread) waits until the main thread has moved the
+clock far enough, runs with a second core are not deterministic.
+"""
+
+import os
+import sys
+import threading
+import time
+
+TICKS_PERIOD = 1 << 30
+_TICKS_MAX = TICKS_PERIOD - 1
+_TICKS_HALF = TICKS_PERIOD // 2
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now_us = 0
+        self.timers = []
+        self.moved = threading.Condition()
+        self.waiting = 0  # threads in wait_until
+        self.generation = 0  # bumped by reset, releases the waiting threads
+
+    def next_deadline(self):
+        deadlines = [t.deadline for t in self.timers]
+        return min(deadlines) if deadlines else None
+
+    def advance(self, us: int) -> None:
+        """Move time forward by us, firing the timers that fall due"""
+        self.advance_to(self.now_us + us)
+
+    def advance_to(self, end: int) -> None:
+        while True:
+            due = [t for t in self.timers if t.deadline <= end]
+            if not due:
+                break
+            timer = min(due, key=lambda t: t.deadline)
+            self.now_us = max(self.now_us, timer.deadline)
+            timer.fire()
+        self.now_us = max(self.now_us, end)
+        if self.waiting:
+            with self.moved:
+                self.moved.notify_all()
+            # Let the other core run before time moves on
+            time.sleep(0)
+
+    def wait_until(self, end: int) -> None:
+        """Block a thread other than the main one until the clock reaches end"""
+        generation = self.generation
+        with self.moved:
+            self.waiting += 1
+            while self.now_us < end and self.generation == generation:
+                self.moved.wait(0.1)
+            self.waiting -= 1
+
+
+clock = Clock()
+
+
+def ticks_us() -> int:
+    return clock.now_us & _TICKS_MAX
+
+
+def ticks_ms() -> int:
+    return (clock.now_us // 1000) & _TICKS_MAX
+
+
+def ticks_cpu() -> int:
+    return ticks_us()
+
+
+def ticks_diff(a: int, b: int) -> int:
+    return ((a - b + _TICKS_HALF) & _TICKS_MAX) - _TICKS_HALF
+
+
+def ticks_add(a: int, b: int) -> int:
+    return (a + b) & _TICKS_MAX
+
+
+def sleep_us(us: int) -> None:
+    if threading.current_thread() is threading.main_thread():
+        clock.advance(us)
+    else:
+        clock.wait_until(clock.now_us + us)
+
+
+def sleep_ms(ms: int) -> None:
+    sleep_us(ms * 1000)
+
+
+def install() -> None:
+    """Put the simulated modules first on the path and give the time module
+    the MicroPython ticks/sleep functions, driven by the virtual clock"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    if here not in sys.path:
+        sys.path.insert(0, here)
+    for name in ("ticks_us", "ticks_ms", "ticks_cpu", "ticks_diff", "ticks_add", "sleep_us", "sleep_ms"):
+        setattr(time, name, globals()[name])
+
+
+def reset() -> None:
+    """Start over at t=0 with no timers, pins, UARTs or state machines"""
+    import machine
+
+    with clock.moved:
+        clock.generation += 1
+        clock.now_us = 0
+        clock.timers.clear()
+        clock.moved.notify_all()
+    machine.reset()
+    rp2 = sys.modules.get("rp2")
+    if rp2 is not None:
+        rp2.reset()
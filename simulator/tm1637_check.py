@@ -0,0 +1,200 @@
+"""Assertion checks of TM1637Group on the simulated pins.
+
+    python3 simulator/tm1637_check.py
+
+The edges recorded on the shared CLK line and on each DIO line are decoded
+the way a TM1637 reads them (start and stop conditions, bits sampled on the
+rising CLK edge, LSB first, a ninth clock for the ACK) and applied to a model
+of each display's RAM, which is compared with the digits the displays
+should show. Exits with an AssertionError on the first mismatch.
+"""
+
+import os
+import sys
+
+import sim
+
+sim.install()
+
+import machine  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(1, os.path.join(os.path.dirname(HERE), "lib"))
+
+import tm1637  # noqa: E402
+
+CLK = 0
+DIOS = [1, 2, 3, 4]
+DELAY = 2  # us, the shortest timing the simulated display accepts (bench)
+
+
+def decode(clk: int, dio: int) -> list:
+    """Transactions one display read from the bus, each a bytes of the
+    bytes between a start and a stop condition"""
+    # At the same instant CLK falls before DIO changes and DIO changes
+    # before CLK rises, the driver writes them in that order
+    events = [(t, 2 if v else 0, clk, v) for t, v in machine.Pin.edges.get(clk, [])]
+    events += [(t, 1, dio, v) for t, v in machine.Pin.edges.get(dio, [])]
+    events.sort(key=lambda e: e[:2])
+    clk_level = 0
+    dio_level = 0
+    transactions = []
+    current = None
+    value = 0
+    n = 0
+    for _, _, pin, level in events:
+        if pin == dio:
+            if clk_level and current is not None and level:
+                transactions.append(bytes(current))  # stop
+                current = None
+            elif clk_level and not level:
+                current = []  # start
+                value = 0
+                n = 0
+            dio_level = level
+            continue
+        clk_level = level
+        if not level or current is None:
+            continue
+        if n == 8:
+            n = 0  # ACK clock
+            value = 0
+            continue
+        value |= dio_level << n
+        n += 1
+        if n == 8:
+            current.append(value)
+    return transactions
+
+
+def display_ram(transactions):
+    """RAM and display control byte of a display after the transactions"""
+    ram = bytearray(6)
+    ctrl = None
+    auto = True
+    for data in transactions:
+        cmd = data[0]
+        if cmd & 0xC0 == tm1637.TM1637_CMD1:
+            auto = not cmd & tm1637.TM1637_FIXED
+        elif cmd & 0xC0 == tm1637.TM1637_CMD2:
+            addr = cmd & 0x07
+            for seg in data[1:]:
+                ram[addr] = seg
+                if auto:
+                    addr += 1
+        elif cmd & 0xC0 == tm1637.TM1637_CMD3:
+            ctrl = cmd
+    return ram, ctrl
+
+
+def frame(group, i: int, string: str) -> bytes:
+    return bytes(group.displays[i].encode_string(string))
+
+
+def check_rams(group, strings, ctrl=0x8F) -> None:
+    for i, string in enumerate(strings):
+        ram, got = display_ram(decode(CLK, DIOS[i]))
+        assert ram[:4] == frame(group, i, string), (i, ram.hex(" "), string)
+        assert got == ctrl, (i, got)
+
+
+def new_group():
+    sim.reset()
+    return tm1637.TM1637Group(CLK, DIOS, delay=DELAY)
+
+
+def check_full_update() -> None:
+    group = new_group()
+    values = [12, 345, -7, 9999]
+    for disp, value in zip(group.displays, values):
+        disp.number(value)
+    assert group.update()
+    check_rams(group, [f"{v: >4d}" for v in values])
+    assert not group.update()  # nothing staged
+
+
+def check_one_display() -> None:
+    # Only the display that changed sees a transfer, the others keep DIO high
+    group = new_group()
+    for i, disp in enumerate(group.displays):
+        disp.number(i)
+    group.update()
+    edges = [len(machine.Pin.edges[dio]) for dio in DIOS]
+    group.displays[2].show("abcd")
+    assert group.update()
+    for i, dio in enumerate(DIOS):
+        changed = len(machine.Pin.edges[dio]) != edges[i]
+        assert changed == (i == 2), (i, changed)
+    check_rams(group, ["   0", "   1", "abcd", "   3"])
+
+
+def check_dirty_ranges() -> None:
+    # The transfer covers the union of the dirty digits, the displays get
+    # their own current digits for the ones they didn't change
+    group = new_group()
+    for disp in group.displays:
+        disp.show("0000")
+    group.update()
+    sent = group.bytes_sent
+    group.displays[0].write(frame(group, 0, "1"), 1)
+    group.displays[3].write(frame(group, 3, "2"), 3)
+    assert group.update()
+    assert group.bytes_sent - sent == 4, group.bytes_sent - sent  # address + digits 1..3
+    check_rams(group, ["0100", "0000", "0000", "0002"])
+
+
+def check_brightness() -> None:
+    group = new_group()
+    for disp in group.displays:
+        disp.show("8888")
+    group.update()
+    group.brightness(3)
+    check_rams(group, ["8888"] * 4, ctrl=0x8B)
+
+
+def check_without_mem32() -> None:
+    # Pin by pin when the SIO registers aren't there
+    mem32 = tm1637.mem32
+    tm1637.mem32 = None
+    try:
+        check_full_update()
+    finally:
+        tm1637.mem32 = mem32
+
+
+def check_update_time() -> None:
+    """A full update of four displays takes about as long as one display"""
+    sim.reset()
+    single = tm1637.TM1637(machine.Pin(10), machine.Pin(11), delay=DELAY)
+    start = sim.clock.now_us
+    single.show("1234")
+    single_us = sim.clock.now_us - start
+
+    group = new_group()
+    for disp in group.displays:
+        disp.show("1234")
+    start = sim.clock.now_us
+    group.update()
+    group_us = sim.clock.now_us - start
+    assert group_us <= single_us * 11 // 10, (group_us, single_us)
+    print(f"    one display {single_us} us, four in a group {group_us} us")
+
+
+CHECKS = [
+    check_full_update,
+    check_one_display,
+    check_dirty_ranges,
+    check_brightness,
+    check_without_mem32,
+    check_update_time,
+]
+
+
+def main() -> None:
+    for check in CHECKS:
+        check()
+        print(f"ok  {check.__name__}")
+
+
+if __name__ == "__main__":
+    main()
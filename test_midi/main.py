@@ -1,4 +1,5 @@
-from machine import Pin, Timer, UART
+from machine import Pin, Timer, UART, idle
+from inputs import ButtonScanner, PRESS
 
 k_uart_id = int(0)
 k_led_pin = int(25)
@@ -7,15 +8,13 @@ k_channel = int(0)
 k_program = int(0)
 
 led = Pin(25, Pin.OUT)
-timer_main = Timer()
 timer_led = Timer()
 uart = UART(k_uart_id)
 uart.init(baudrate=31250)
-btn = Pin(k_btn_pin, Pin.IN, Pin.PULL_UP)
 
 
-def send(t):
-    if btn.value() is not 0:
+def send(idx: int, event: int):
+    if event != PRESS:
         return
 
     led.on()
@@ -25,12 +24,10 @@ def send(t):
     uart.flush()
 
 
-# The callback is delayed by 50ms. If after that period the button is not still pressed
-# the action is not performed. This is to reject noise.
-btn.irq(
-    trigger=Pin.IRQ_FALLING,
-    handler=lambda p: timer_main.init(mode=Timer.ONE_SHOT, period=50, callback=send),
-)
+# The button has to read pressed for 10 scans 5ms apart before sending. This is to
+# reject noise.
+buttons = ButtonScanner([k_btn_pin], send, samples=10, period_ms=5)
+buttons.start()
 
 while True:
-    pass
+    idle()
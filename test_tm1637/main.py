@@ -1,60 +1,59 @@
 import tm1637
-from machine import Pin, Timer
+import storage
+from inputs import ButtonScanner, PRESS, RELEASE
+from machine import Pin
+from time import sleep_ms
 import json
 
 k_led_pin = int(25)
 k_btn_pin = int(16)
-k_file_name = "data.json"
+k_file_name = "data.log"
+k_legacy_file_name = "data.json"
 
 
 class Test_tm1637:
     def __init__(self) -> None:
         self.disp = tm1637.TM1637(clk=Pin(26), dio=Pin(27))
+        self.frames = tm1637.FrameCache(self.disp, 0, 127, "P{0:3}")
         self.led = Pin(k_led_pin, Pin.OUT)
         self.value = 0
-        self.btn = Pin(k_btn_pin, Pin.IN, Pin.PULL_UP)
-        self.button_timer = Timer()
+        self.buttons = ButtonScanner([k_btn_pin], self.button_event)
 
         # Try to read from file first
-        data = dict()
-        try:
-            data = json.load(open(k_file_name))
-        except:
-            pass
-        self.value = data.get("value", 0)
+        self.store = storage.RingStore(k_file_name, "B", self._snapshot)
+        data = self.store.load()
+        if data is not None:
+            self.value = data[0]
+        else:
+            try:
+                self.value = json.load(open(k_legacy_file_name)).get("value", 0)
+            except:
+                pass
 
         self.disp.brightness(3)
-        self.btn.irq(handler=self.button_callback)
+        self.buttons.start()
 
         self.led.off()
-        self.disp.show(f"P{self.value:3}")
+        self.frames.show(self.value)
 
-    def button_callback(self, pin: Pin):
-
-        def button_timer_callback(timer: Timer):
+    def button_event(self, idx: int, event: int):
+        if event == PRESS:
             self.value += 1
             if self.value > 127:
                 self.value = 0
 
-            self.disp.show(f"P{self.value:3}")
-
-            if self.btn.value() is 0:
-                self.led.on()
-            else:
-                self.led.off()
-
-            data = dict()
-            data["value"] = self.value
-            file = open(k_file_name, "w")
-            json.dump(data, file)
+            self.frames.show(self.value)
+            self.led.on()
+            self.store.mark_dirty()
+        elif event == RELEASE:
+            self.led.off()
 
-        # Delay the action for a few milliseconds to reject some noise
-        self.button_timer.init(
-            mode=Timer.ONE_SHOT, period=20, callback=button_timer_callback
-        )
+    def _snapshot(self):
+        return (self.value,)
 
 
 tm = Test_tm1637()
 
 while 1:
-    pass
+    tm.store.poll()
+    sleep_ms(100)
@@ -0,0 +1,47 @@
+"""Cross-compile the shared library to .mpy for the Pico.
+
+    python3 tools/build_mpy.py [--out build/lib] [--mpy-cross PATH]
+
+Every module in lib/ is compiled with mpy-cross (pip install mpy-cross,
+the version must match the firmware) into the output directory. Copy the
+result to the board's /lib, without the .py sources: when both are present
+the .py file is imported.
+
+    mpremote fs cp -r build/lib/ :
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+LIB = os.path.join(ROOT, "lib")
+
+
+def build(out: str, mpy_cross: str, march: str) -> None:
+    os.makedirs(out, exist_ok=True)
+    for name in sorted(os.listdir(LIB)):
+        if not name.endswith(".py"):
+            continue
+        target = os.path.join(out, name[:-3] + ".mpy")
+        cmd = [mpy_cross, "-march=" + march, "-s", name, "-o", target, os.path.join(LIB, name)]
+        subprocess.run(cmd, check=True)
+        print(f"{name:<16} {os.path.getsize(os.path.join(LIB, name)):>6} -> {os.path.getsize(target):>6} bytes")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default=os.path.join(ROOT, "build", "lib"))
+    parser.add_argument("--mpy-cross", default="mpy-cross", help="mpy-cross executable")
+    parser.add_argument("--march", default="armv6m", help="armv6m for the RP2040")
+    args = parser.parse_args()
+    try:
+        build(args.out, args.mpy_cross, args.march)
+    except FileNotFoundError:
+        sys.exit(f"{args.mpy_cross} not found, install it with pip install mpy-cross")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Measure import time and heap use of the shared library on the board.
+
+    mpremote run tools/import_time.py
+
+Run it once with the .py sources in /lib and once with the .mpy build (or a
+firmware with the frozen manifest) to compare. The modules are the ones in
+/lib: with frozen ones leave the sources there, frozen modules come first
+on sys.path. They are imported in alphabetical order, which puts the
+modules of /lib another one imports (presets for sysex) ahead of it, so
+each line only counts the module itself.
+"""
+
+import gc
+import os
+import sys
+from time import ticks_us, ticks_diff
+
+LIB = "/lib"
+
+
+def modules() -> list:
+    """Names of the modules in /lib, sorted"""
+    names = []
+    for entry in os.listdir(LIB):
+        name, _, ext = entry.rpartition(".")
+        if ext in ("py", "mpy") and name not in names:
+            names.append(name)
+    names.sort()
+    return names
+
+
+def origin(module) -> str:
+    path = getattr(module, "__file__", None)
+    if path is None:
+        return "frozen"
+    return path.rsplit(".", 1)[-1]
+
+
+def main() -> None:
+    names = modules()
+    for name in names:
+        sys.modules.pop(name, None)
+    gc.collect()
+    start_heap = gc.mem_alloc()
+    start = ticks_us()
+
+    print("module       from      us    heap")
+    for name in names:
+        gc.collect()
+        heap = gc.mem_alloc()
+        t = ticks_us()
+        module = __import__(name)
+        us = ticks_diff(ticks_us(), t)
+        gc.collect()
+        print(f"{name:<12} {origin(module):<6} {us:>7} {gc.mem_alloc() - heap:>7}")
+
+    gc.collect()
+    print(f"{'total':<12} {'':<6} {ticks_diff(ticks_us(), start):>7} {gc.mem_alloc() - start_heap:>7}")
+    print(f"free heap {gc.mem_free()}")
+
+
+main()
@@ -0,0 +1,8 @@
+# Freeze the shared library into the firmware, the modules then run from
+# flash and cost neither compile time nor heap for their bytecode:
+#
+#   make -C ports/rp2 BOARD=RPI_PICO FROZEN_MANIFEST=/path/to/pico/tools/manifest.py
+#
+# Frozen modules come before /lib in sys.path, remove the copies on the board.
+include("$(PORT_DIR)/boards/manifest.py")
+freeze("../lib")